@@ -0,0 +1,147 @@
+import heapq
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import metrics
+
+Job = namedtuple('Job', ['name', 'media_uri', 'status', 'transcript_path', 'failure_reason'])
+
+MEDIA_FORMATS = ('amr', 'flac', 'm4a', 'mp3', 'mp4', 'ogg', 'wav', 'webm')
+
+
+def media_format(media_uri: str, default: str = 'mp4') -> str:
+    suffix = Path(media_uri).suffix.lstrip('.').lower()
+    return suffix if suffix in MEDIA_FORMATS else default
+
+
+def job_name(media_uri: str, language: str) -> str:
+    return f'{Path(media_uri).name}-{language}'
+
+
+class TranscriptionJobManager:
+    """
+    Runs many Amazon Transcribe jobs at once with one client. Jobs are started concurrently, each
+    one is polled with its own exponential backoff (from `initial_delay` up to `max_delay` seconds),
+    and a job is yielded as soon as it fails or its transcript has been streamed to `artifacts_path`.
+    Jobs that already exist are picked up instead of restarted, and transcripts already on disk are
+    not fetched again.
+    """
+
+    def __init__(self, client=None, session: requests.Session = None,
+                 artifacts_path: str = 'artifacts/transcriptions/amazon', initial_delay: float = 2.0,
+                 max_delay: float = 30.0, backoff: float = 1.5, timeout: float = 4 * 3600, concurrency: int = 8,
+                 chunk_size: int = 1 << 20):
+        if client is None:
+            import boto3
+            client = boto3.client('transcribe')
+        self.client = client
+        self.session = session or requests.Session()
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+        self.artifacts_path = Path(artifacts_path)
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.artifacts_path.mkdir(parents=True, exist_ok=True)
+
+    def transcript_path(self, name: str) -> Path:
+        return self.artifacts_path / f'{name}.json'
+
+    def start(self, media_uri: str, name: str, language: str, settings: dict = None) -> None:
+        try:
+            self.client.start_transcription_job(
+                TranscriptionJobName=name,
+                Media={'MediaFileUri': media_uri},
+                MediaFormat=media_format(media_uri),
+                LanguageCode=language,
+                Settings=settings or {'ShowSpeakerLabels': True, 'MaxSpeakerLabels': 10, 'ShowAlternatives': False},
+            )
+            metrics.inc('transcribe_jobs_started_total')
+        except self.client.exceptions.ConflictException:
+            logging.info(f'Job {name} already exists, waiting for it')
+
+    def download(self, name: str, uri: str) -> Path:
+        """
+        Streams the transcript to disk in `chunk_size` blocks; the file appears only once complete.
+        """
+        path = self.transcript_path(name)
+        partial = path.with_suffix('.json.part')
+        with metrics.timer('transcribe_download_seconds'):
+            with self.session.get(uri, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                with open(partial, 'wb') as f:
+                    for chunk in response.iter_content(self.chunk_size):
+                        f.write(chunk)
+        os.replace(partial, path)
+        logging.info(f'Transcript of {name} saved to {path}')
+        return path
+
+    def _describe(self, name: str) -> Optional[dict]:
+        metrics.inc('transcribe_polls_total')
+        try:
+            return self.client.get_transcription_job(TranscriptionJobName=name)['TranscriptionJob']
+        except self.client.exceptions.BadRequestException as e:
+            return {'TranscriptionJobStatus': 'FAILED', 'FailureReason': str(e)}
+        except Exception as e:
+            # throttling and connection errors: try again at the next, longer, interval
+            logging.warning(f'Polling {name} failed: {e}')
+            metrics.inc('transcribe_poll_errors_total', error=type(e).__name__)
+            return None
+
+    def transcribe(self, media_uris: Iterable[str], language: str = 'en-US', settings: dict = None) -> Iterator[Job]:
+        """
+        Transcribes every media uri and yields a `Job` per uri in completion order.
+        """
+        uris = {job_name(uri, language): uri for uri in media_uris}
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix='transcribe') as executor:
+            started, pending = time.monotonic(), []
+            for name, uri in uris.items():
+                if self.transcript_path(name).exists():
+                    yield Job(name, uri, 'COMPLETED', self.transcript_path(name), None)
+                else:
+                    heapq.heappush(pending, (started, self.initial_delay, name))
+            for future in [executor.submit(self.start, uris[name], name, language, settings) for _, _, name in pending]:
+                future.result()
+            downloads: dict[Future, str] = {}
+            while pending or downloads:
+                for future in [future for future in downloads if future.done()]:
+                    name = downloads.pop(future)
+                    if future.exception() is None:
+                        metrics.observe('transcribe_job_seconds', time.monotonic() - started, status='COMPLETED')
+                        yield Job(name, uris[name], 'COMPLETED', future.result(), None)
+                    else:
+                        yield Job(name, uris[name], 'FAILED', None, f'Download failed: {future.exception()}')
+                if not pending:
+                    time.sleep(0.05)
+                    continue
+                next_check, delay, name = pending[0]
+                now = time.monotonic()
+                if next_check > now:
+                    time.sleep(min(next_check - now, 0.05) if downloads else next_check - now)
+                    continue
+                heapq.heappop(pending)
+                job = self._describe(name)
+                status = job['TranscriptionJobStatus'] if job else 'UNKNOWN'
+                if status == 'COMPLETED':
+                    downloads[executor.submit(self.download, name, job['Transcript']['TranscriptFileUri'])] = name
+                elif status == 'FAILED':
+                    logging.error(f'Job {name} failed: {job.get("FailureReason")}')
+                    metrics.observe('transcribe_job_seconds', now - started, status='FAILED')
+                    yield Job(name, uris[name], 'FAILED', None, job.get('FailureReason'))
+                elif now - started > self.timeout:
+                    yield Job(name, uris[name], 'TIMED_OUT', None, f'Not finished after {self.timeout} seconds')
+                else:
+                    heapq.heappush(pending, (now + delay, min(delay * self.backoff, self.max_delay), name))
@@ -0,0 +1,218 @@
+import json
+import math
+import os
+import sys
+from array import array
+from typing import Iterator, TextIO, Union
+
+from text.transcript import NO_SPEAKER, Transcript
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _Scanner:
+    """
+    Pulls JSON values out of a text stream one at a time, keeping only a window of the file in memory.
+    """
+
+    def __init__(self, fp: TextIO, block_size: int = 1 << 20):
+        self.fp = fp
+        self.block_size = block_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, block_size: int = None) -> bool:
+        chunk = self.fp.read(block_size or self.block_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def take(self, expected: str = None) -> str:
+        char = self.peek()
+        if expected is not None and char != expected:
+            raise ValueError(f'Expected {expected!r} but found {char!r} in the transcript JSON')
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        block_size = self.block_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the window may continue in the next block
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # values larger than the window double the read size instead of re-decoding per block
+            if not self._fill(block_size):
+                continue
+            block_size *= 2
+
+    def members(self) -> Iterator[str]:
+        """
+        Yields the keys of an object; the caller consumes each member value before resuming.
+        """
+        self.take('{')
+        if self.peek() == '}':
+            self.take()
+            return
+        while True:
+            key = self.value()
+            self.take(':')
+            yield key
+            if self.take() == '}':
+                return
+
+    def elements(self) -> Iterator:
+        self.take('[')
+        if self.peek() == ']':
+            self.take()
+            return
+        while True:
+            yield self.value()
+            if self.take() == ']':
+                return
+
+
+def iter_transcribe_events(fp: TextIO) -> Iterator[tuple[str, dict]]:
+    """
+    Streams ('segment', speaker segment) and ('item', item) pairs from an Amazon Transcribe result
+    file without loading it; other members, including the full transcript text, are skipped.
+    """
+    scanner = _Scanner(fp)
+    for key in scanner.members():
+        if key != 'results':
+            scanner.value()
+            continue
+        for results_key in scanner.members():
+            if results_key == 'items':
+                for item in scanner.elements():
+                    yield 'item', item
+            elif results_key == 'speaker_labels':
+                for labels_key in scanner.members():
+                    if labels_key == 'segments':
+                        for segment in scanner.elements():
+                            yield 'segment', segment
+                    else:
+                        scanner.value()
+            else:
+                scanner.value()
+
+
+def _iter_response_events(response: dict) -> Iterator[tuple[str, dict]]:
+    results = response['results']
+    for segment in results.get('speaker_labels', {}).get('segments', []):
+        yield 'segment', segment
+    for item in results['items']:
+        yield 'item', item
+
+
+class ItemColumns:
+    """
+    Transcribe items as parallel arrays. Punctuation has NaN times and inherits the speaker of
+    the word before it; `speaker` indexes `speakers`.
+    """
+
+    __slots__ = ('start', 'end', 'confidence', 'content', 'punctuation', 'speaker', 'speakers')
+
+    def __init__(self):
+        self.start = array('d')
+        self.end = array('d')
+        self.confidence = array('f')
+        self.content: list[str] = []
+        self.punctuation = array('b')
+        self.speaker = array('h')
+        self.speakers: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.content)
+
+    def append(self, item: dict) -> None:
+        alternative = item['alternatives'][0]
+        self.start.append(float(item.get('start_time', math.nan)))
+        self.end.append(float(item.get('end_time', math.nan)))
+        self.confidence.append(float(alternative.get('confidence') or 0))
+        self.content.append(sys.intern(alternative['content']))
+        self.punctuation.append(item['type'] == 'punctuation')
+        self.speaker.append(NO_SPEAKER)
+
+    def speaker_label(self, index: int) -> str:
+        speaker = self.speaker[index]
+        return None if speaker == NO_SPEAKER else self.speakers[speaker]
+
+    def transcript(self) -> Transcript:
+        """
+        The items as a `Transcript`, with punctuation attached to the word before it.
+        """
+        return Transcript.from_columns(self.start, self.end, self.speaker, self.content, self.punctuation,
+                                       self.speakers)
+
+
+class _Segments:
+    __slots__ = ('start', 'end', 'speaker')
+
+    def __init__(self):
+        self.start = array('d')
+        self.end = array('d')
+        self.speaker = array('h')
+
+
+def assign_speakers(columns: ItemColumns, segments: _Segments, tolerance: float = 1e-3) -> None:
+    """
+    Sorted merge of items and speaker segments by start time: linear, and no float keyed lookups.
+    """
+    order = sorted(range(len(segments.start)), key=segments.start.__getitem__)
+    j, previous = 0, NO_SPEAKER
+    for i in range(len(columns)):
+        if columns.punctuation[i]:
+            columns.speaker[i] = previous
+            continue
+        start = columns.start[i]
+        while j < len(order) and segments.end[order[j]] + tolerance < start:
+            j += 1
+        if j < len(order) and segments.start[order[j]] - tolerance <= start:
+            previous = segments.speaker[order[j]]
+        columns.speaker[i] = previous
+
+
+def read_transcribe(source: Union[str, os.PathLike, dict, TextIO], speaker_name: str = None) -> ItemColumns:
+    """
+    Reads an Amazon Transcribe result (a path, an open file or an already decoded response) into
+    `ItemColumns` with speakers assigned. `speaker_name` relabels every speaker, for single speaker recordings.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'r') as f:
+            return read_transcribe(f, speaker_name)
+    events = _iter_response_events(source) if isinstance(source, dict) else iter_transcribe_events(source)
+    columns, segments, speaker_ids = ItemColumns(), _Segments(), {}
+    for kind, value in events:
+        if kind == 'item':
+            columns.append(value)
+            continue
+        label = speaker_name or value['speaker_label']
+        if label not in speaker_ids:
+            speaker_ids[label] = len(columns.speakers)
+            columns.speakers.append(label)
+        segments.start.append(float(value['start_time']))
+        segments.end.append(float(value['end_time']))
+        segments.speaker.append(speaker_ids[label])
+    assign_speakers(columns, segments)
+    return columns
@@ -15,7 +15,9 @@ from pathlib import Path
 
 from fire import Fire
 from google.cloud import speech
-from google.cloud import storage
+
+from text.transcript import Transcript
+from utils.staging import stage_to_gcs
 
 
 class Transcriber:
@@ -32,40 +34,37 @@ class Transcriber:
 
 
 def upload_blob(source_file_name):
-    """Uploads a file to the bucket."""
-    # The ID of your GCS bucket
-    # bucket_name = "your-bucket-name"
-    # The path to your file to upload
-    # source_file_name = "local/path/to/file"
-    # The ID of your GCS object
-    # destination_blob_name = "storage-object-name"
-    bucket_name = 'home-experiments'
-
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    destination_blob_name = Path(source_file_name).name
-    blob = bucket.blob(destination_blob_name)
-
-    blob.upload_from_filename(source_file_name)
-
-    print(
-        "File {} uploaded to {}.".format(
-            source_file_name, destination_blob_name
-        )
-    )
-    return f'gs://{bucket_name}/{destination_blob_name}'
+    """Uploads a file to the bucket unless the same content is already there."""
+    return stage_to_gcs(source_file_name)
 
 
 def upload(file_path: Path):
-    storage_client = storage.Client()
-
-    buckets = list(storage_client.list_buckets())
-
-    bucket = storage_client.get_bucket("home-experiments")
-
-    blob = bucket.blob(f'{file_path.name}')
-    blob.upload_from_filename(file_path)
-    print(buckets)
+    return stage_to_gcs(str(file_path))
+
+
+def google_words(response) -> list:
+    """
+    The recognized words. With diarization only the last result carries speaker tags, and its
+    words cover the whole recording; otherwise every result holds its own part of the words.
+    """
+    results = [result for result in response.results if result.alternatives]
+    if not results:
+        return []
+    last = results[-1].alternatives[0].words
+    if any(word.speaker_tag for word in last):
+        return list(last)
+    return [word for result in results for word in result.alternatives[0].words]
+
+
+def google_transcript(response) -> Transcript:
+    """
+    A `Transcript` with one unit per word; speaker tag 0 means no speaker.
+    """
+    return Transcript.from_units(
+        (word.start_time.total_seconds(), word.end_time.total_seconds(),
+         str(word.speaker_tag) if word.speaker_tag else None, word.word)
+        for word in google_words(response)
+    )
 
 
 class GoogleTranscriber(Transcriber):
@@ -74,10 +73,10 @@ class GoogleTranscriber(Transcriber):
         :param file_path: Path to the file to transcribe s3 or gcp.
         """
         super().__init__(file_path)
+        self.project_name = Path(self.file_path).name
         if not self.file_path.startswith('gs://'):
             self.file_path = upload_blob(self.file_path)
             print('new file path is ', self.file_path)
-        self.project_name = Path(self.file_path).name
         self.language = language
         self.job_name = f'{self.project_name}-{self.language}'
         self.client = speech.SpeechClient()
@@ -115,27 +114,11 @@ class GoogleTranscriber(Transcriber):
         timeout = 60 * 60
         response = operation.result(timeout=timeout)
 
-        # The transcript within each result is separate and sequential per result.
-        # However, the words list within an alternative includes all the words
-        # from all the results thus far. Thus, to get all the words with speaker
-        # tags, you only have to take the words list from the last result:
-        result = response.results[-1]
-
-        words_info = result.alternatives[0].words
-
-        # Printing out the output:
-        speakers_speach = []
-        for word_info in words_info:
-            if len(speakers_speach) == 0 or speakers_speach[-1][1] != word_info.speaker_tag:
-                speakers_speach.append([word_info.word, word_info.speaker_tag])
-            else:
-                speakers_speach[-1][0] += ' ' + word_info.word
-            print(u"word: '{}', speaker_tag: {}".format(
-                word_info.word, word_info.speaker_tag))
+        transcript = google_transcript(response)
         file_name = f'{self.artifacts_path}/{self.project_name}.txt'
         with open(file_name, 'w') as f:
-            for speach in speakers_speach:
-                f.write(f'{speach[1]}: {speach[0]}\n')
+            for line in transcript.group(max_gap=None).lines():
+                f.write(f'{line}\n')
         return file_name
 
 
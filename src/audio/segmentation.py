@@ -0,0 +1,241 @@
+import logging
+import subprocess
+import wave
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable
+
+import numpy as np
+from fire import Fire
+
+from audio.amazon.reader import NO_SPEAKER, ItemColumns, read_transcribe
+from audio.transcriber import Transcriber
+from utils.metrics import metrics
+
+SAMPLE_RATE = 16000
+
+# `start` and `end` bound the audio sent for transcription; words are kept from `keep` on
+Segment = namedtuple('Segment', ['index', 'start', 'end', 'keep'])
+
+
+def decode(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Mono float32 samples in [-1, 1]. 16 bit WAV files are read directly, anything else is decoded
+    and resampled by ffmpeg.
+    """
+    if Path(path).suffix.lower() == '.wav':
+        with wave.open(str(path), 'rb') as f:
+            if f.getsampwidth() == 2 and f.getframerate() == sample_rate:
+                channels = f.getnchannels()
+                samples = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2').reshape(-1, channels)
+                # downmix in int32 rather than through a float64 mean, hours of audio are gigabytes
+                mono = samples[:, 0] if channels == 1 else samples.sum(axis=1, dtype=np.int32)
+                return _scaled(mono, 32768 * channels)
+    command = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', str(path), '-f', 's16le', '-ac', '1',
+               '-ar', str(sample_rate), '-']
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+    return _scaled(np.frombuffer(output, dtype='<i2'), 32768)
+
+
+def _scaled(samples: np.ndarray, scale: int) -> np.ndarray:
+    # one float32 copy, divided in place
+    result = samples.astype(np.float32)
+    result /= scale
+    return result
+
+
+def write_wav(path: Path, samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> None:
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def frame_energies(samples: np.ndarray, frame: int, block: int = 4096) -> np.ndarray:
+    """
+    Mean square of every whole `frame` of samples, computed `block` frames at a time in float32,
+    so that no copy of the whole recording is made.
+    """
+    count = len(samples) // frame
+    energy = np.empty(count, dtype=np.float32)
+    for first in range(0, count, block):
+        last = min(count, first + block)
+        frames = np.asarray(samples[first * frame:last * frame], dtype=np.float32).reshape(last - first, frame)
+        np.einsum('ij,ij->i', frames, frames, out=energy[first:last])
+    energy /= frame
+    return energy
+
+
+def find_silences(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = 30,
+                  min_silence: float = 0.5, margin_db: float = 10.0) -> np.ndarray:
+    """
+    Energy based voice activity detection: frames quieter than the noise floor (2nd percentile of
+    the frame energies) plus `margin_db`, and below the midpoint between the floor and the speech
+    level, are silent. Returns (start, end) seconds of the silent runs lasting at least `min_silence` seconds.
+    """
+    frame = sample_rate * frame_ms // 1000
+    count = len(samples) // frame
+    if count == 0:
+        return np.empty((0, 2))
+    energy = 10 * np.log10(frame_energies(samples, frame) + 1e-10)
+    floor, speech = np.percentile(energy, [2, 90])
+    silent = energy < min(floor + margin_db, (floor + speech) / 2)
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    runs = np.stack([starts, ends], axis=1)
+    runs = runs[(ends - starts) * frame_ms >= min_silence * 1000]
+    return runs * frame_ms / 1000
+
+
+def plan_segments(duration: float, silences: np.ndarray, target: float = 600, max_length: float = 900,
+                  overlap: float = 30) -> list[Segment]:
+    """
+    Cuts in the middle of the silence closest to every `target` seconds, never further apart than
+    `max_length`. Each segment but the first starts `overlap` seconds early, so that speakers can be
+    matched against the previous segment.
+    """
+    middles = silences.mean(axis=1) if len(silences) else np.empty(0)
+    cuts = [0.0]
+    while duration - cuts[-1] > max_length:
+        low, high = np.searchsorted(middles, [cuts[-1] + target / 2, cuts[-1] + max_length])
+        candidates = middles[low:high]
+        if len(candidates):
+            cuts.append(float(candidates[np.argmin(np.abs(candidates - cuts[-1] - target))]))
+        else:
+            cuts.append(cuts[-1] + max_length)
+    cuts.append(duration)
+    return [Segment(index, max(0.0, start - overlap) if index else 0.0, end, start)
+            for index, (start, end) in enumerate(zip(cuts, cuts[1:]))]
+
+
+def _match_speakers(previous: ItemColumns, current: ItemColumns, window: tuple[float, float]) -> dict[int, int]:
+    """
+    Votes, for every word of `current` inside the overlap `window`, for the speaker of the
+    `previous` word nearest in time, and pairs speakers greedily by votes.
+    """
+    reference = [i for i in range(len(previous)) if window[0] <= previous.start[i] < window[1]
+                 and previous.speaker[i] != NO_SPEAKER and not previous.punctuation[i]]
+    if not reference:
+        return {}
+    times = np.array([previous.start[i] for i in reference])
+    votes = Counter()
+    for i in range(len(current)):
+        if window[0] <= current.start[i] < window[1] and current.speaker[i] != NO_SPEAKER:
+            nearest = reference[int(np.argmin(np.abs(times - current.start[i])))]
+            votes[current.speaker[i], previous.speaker[nearest]] += 1
+    mapping, taken = {}, set()
+    for (local, known), _ in votes.most_common():
+        if local not in mapping and known not in taken:
+            mapping[local] = known
+            taken.add(known)
+    return mapping
+
+
+def stitch(segments: list[Segment], parts: list[ItemColumns]) -> ItemColumns:
+    """
+    Joins per segment transcripts into one, shifting times by the segment offsets, dropping the
+    overlap duplicates and mapping every segment's speakers onto one consistent set of labels.
+    """
+    merged = ItemColumns()
+    previous, previous_mapping = None, {}
+    for segment, part in zip(segments, parts):
+        shifted = ItemColumns()
+        shifted.start.extend(start + segment.start for start in part.start)
+        shifted.end.extend(end + segment.start for end in part.end)
+        shifted.confidence, shifted.content, shifted.punctuation = part.confidence, part.content, part.punctuation
+        shifted.speaker, shifted.speakers = part.speaker, part.speakers
+        matched = _match_speakers(previous, shifted, (segment.start, segment.keep)) if previous else {}
+        mapping = {local: previous_mapping[known] for local, known in matched.items()}
+        unmatched = [local for local in range(len(part.speakers)) if local not in mapping]
+        missing = set(previous_mapping.values()) - set(mapping.values())
+        if len(unmatched) == 1 and len(missing) == 1:
+            # the only speaker left on each side, silent during the overlap
+            mapping[unmatched[0]] = missing.pop()
+        for local in range(len(part.speakers)):
+            if local not in mapping:
+                mapping[local] = len(merged.speakers)
+                merged.speakers.append(f'spk_{len(merged.speakers)}')
+        keep = False
+        for i in range(len(shifted)):
+            # punctuation has no time and follows the decision for its word
+            if not shifted.punctuation[i]:
+                keep = shifted.start[i] >= segment.keep
+            if keep:
+                merged.start.append(shifted.start[i])
+                merged.end.append(shifted.end[i])
+                merged.confidence.append(shifted.confidence[i])
+                merged.content.append(shifted.content[i])
+                merged.punctuation.append(shifted.punctuation[i])
+                speaker = shifted.speaker[i]
+                merged.speaker.append(NO_SPEAKER if speaker == NO_SPEAKER else mapping[speaker])
+        previous, previous_mapping = shifted, mapping
+    return merged
+
+
+class SegmentedTranscriber:
+    """
+    Transcribes a long recording as silence delimited segments in parallel. Every segment is written
+    as WAV, staged with `stage` (a local path -> uri function such as `utils.staging.stage_to_s3`),
+    transcribed with `transcriber_factory(uri).transcribe()` and read with `reader`; the results are
+    stitched back into one `ItemColumns` on the recording's timeline.
+    """
+
+    def __init__(self, transcriber_factory: Callable[[str], Transcriber], stage: Callable[[str], str],
+                 reader: Callable = read_transcribe, target: float = 600, max_length: float = 900,
+                 overlap: float = 30, workers: int = 8, workdir: str = 'artifacts/segments'):
+        self.transcriber_factory = transcriber_factory
+        self.stage = stage
+        self.reader = reader
+        self.target = target
+        self.max_length = max_length
+        self.overlap = overlap
+        self.workers = workers
+        self.workdir = Path(workdir)
+
+    def segments(self, samples: np.ndarray) -> list[Segment]:
+        with metrics.timer('segmentation_vad_seconds'):
+            silences = find_silences(samples)
+        return plan_segments(len(samples) / SAMPLE_RATE, silences, self.target, self.max_length, self.overlap)
+
+    def _transcribe(self, name: str, samples: np.ndarray, segment: Segment) -> ItemColumns:
+        path = self.workdir / f'{name}-{segment.index:03}.wav'
+        write_wav(path, samples[int(segment.start * SAMPLE_RATE):int(segment.end * SAMPLE_RATE)])
+        with metrics.timer('segment_transcribe_seconds'):
+            result = self.transcriber_factory(self.stage(str(path))).transcribe()
+        if result is None:
+            raise RuntimeError(f'Segment {segment.index} of {name} was not transcribed')
+        return self.reader(str(result))
+
+    def transcribe(self, path: str) -> ItemColumns:
+        samples = decode(path)
+        segments = self.segments(samples)
+        logging.info(f'{path}: {len(samples) / SAMPLE_RATE:.0f} seconds in {len(segments)} segments')
+        metrics.inc('segments_total', len(segments))
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='segment') as executor:
+            parts = list(executor.map(lambda segment: self._transcribe(Path(path).stem, samples, segment), segments))
+        return stitch(segments, parts)
+
+
+def main(path: str, language: str = 'en-US', target: float = 600, workers: int = 8,
+         formats: Iterable[str] = ('srt', 'txt')):
+    """
+    Transcribes a long recording with Amazon Transcribe in parallel segments and exports the turns.
+    """
+    from audio.amazon.jobs import TranscriptionJobManager
+    from audio.amazon.subtitles import create_subtitles_file
+    from audio.amazon.transcriber import AWSTranscriber
+    from utils.staging import stage_to_s3
+
+    manager = TranscriptionJobManager(concurrency=workers)
+    transcriber = SegmentedTranscriber(lambda uri: AWSTranscriber(uri, language, manager), stage_to_s3,
+                                       target=target, workers=workers)
+    columns = transcriber.transcribe(path)
+    for output in create_subtitles_file(Path(path), columns.transcript().turns(), formats).values():
+        print(output)
+
+
+if __name__ == '__main__':
+    Fire(main)
@@ -0,0 +1,52 @@
+import time
+from pathlib import Path
+
+from fire import Fire
+
+from benchmarks.synthetic import write_vtt
+from text.punkt import sent_tokenize
+from text.summarizers.openai_adapter import PromtProcessor
+from text.tokens import count_tokens
+from text.zoom.processor import ZoomTranscriptionProcessor
+
+
+def legacy_pack(promts: list[str], best_of: int, max_tokens: int, limit: int) -> list[str]:
+    """
+    The character based packer PromtProcessor used before it counted tokens.
+    """
+    sentences = sent_tokenize('\n'.join(promts))
+    promts = [sentences[0]]
+    for line in sentences[1:]:
+        if len(promts[-1]) + len(line) + best_of * max_tokens < limit:
+            promts[-1] += line
+        else:
+            promts.append(line)
+    return promts
+
+
+def main(transcript_path: str = None, minutes: float = 60, best_of: int = 2, max_tokens: int = 400,
+         limit: int = 4001, overlap: int = 0):
+    """
+    Compares the number of API calls (chunks) and packing time of the legacy and token packers.
+    """
+    if transcript_path is None:
+        transcript_path = write_vtt(Path('artifacts/benchmarks') / f'synthetic_{minutes}m.vtt', minutes)
+    lines = ZoomTranscriptionProcessor()(str(transcript_path))
+
+    start = time.perf_counter()
+    legacy = legacy_pack(lines, best_of, max_tokens, limit)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = PromtProcessor(best_of, max_tokens, limit, overlap)(lines)
+    packed_time = time.perf_counter() - start
+
+    for name, result, elapsed in [('legacy', legacy, legacy_time), ('tokens', chunks, packed_time)]:
+        sizes = [count_tokens(chunk) for chunk in result]
+        print(f'{name:>7}: {len(result):5} calls, {sum(sizes):8} prompt tokens, '
+              f'max {max(sizes):5} tokens/chunk, {elapsed:.3f}s')
+    print(f'API calls saved: {len(legacy) - len(chunks)} ({1 - len(chunks) / len(legacy):.0%})')
+
+
+if __name__ == '__main__':
+    Fire(main)
@@ -0,0 +1,217 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from fire import Fire
+
+from text.tokens import count_tokens
+
+
+class Latency:
+    """
+    Lognormal response time distribution: `median` seconds for a `reference_tokens` completion,
+    scaled linearly with the completion length, with `sigma` spread.
+    """
+
+    def __init__(self, median: float = 1.0, sigma: float = 0.5, reference_tokens: int = 200,
+                 seed: Optional[int] = None):
+        self.median = median
+        self.sigma = sigma
+        self.reference_tokens = reference_tokens
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, completion_tokens: int) -> float:
+        with self._lock:
+            factor = self.random.lognormvariate(0, self.sigma)
+        return self.median * factor * max(completion_tokens, 1) / self.reference_tokens
+
+
+class ServerStats:
+    def __init__(self):
+        self.calls = 0
+        self.prompts = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict:
+        return {name: value for name, value in vars(self).items() if not name.startswith('_')}
+
+
+def fake_completion(promt: str, max_tokens: int) -> str:
+    rng = random.Random(promt)
+    words = promt.split() or ['nothing']
+    length = max(1, min(max_tokens, count_tokens(promt) // 8))
+    return ' ' + ' '.join(rng.choice(words) for _ in range(length)) + '.'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'FakeOpenAIServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        name = self.path.rsplit('/', 1)[-1]
+        if self.path.startswith('/files/') and name in self.server.files:
+            payload = self.server.files[name]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self._send(404, {'error': {'message': f'{self.path} not found', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        if not self.path.endswith('/completions'):
+            self._send(404, {'error': {'message': f'{self.path} not found', 'type': 'invalid_request_error'}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.handle_completion(self, request)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Completion endpoint. Point the client at it with
+    `openai.api_base = server.url`; it injects 429s and 5xxs at the given rates, sleeps according
+    to `latency` and accounts prompt and completion tokens; `stream` requests get server-sent
+    events. GET /files/<name> serves `files`, which the Transcribe stub uses for transcript downloads.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: Latency = None, rate_limit_rate: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency or Latency(seed=seed)
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = ServerStats()
+        self.files: dict[str, bytes] = {}
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    @property
+    def url(self) -> str:
+        return f'{self.base_url}/v1'
+
+    def handle_completion(self, handler: _Handler, request: dict) -> None:
+        self.stats.add(calls=1)
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.stats.add(rate_limited=1)
+            handler._send(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                          {'Retry-After': '0.1'})
+            return
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats.add(errors=1)
+            handler._send(503, {'error': {'message': 'The server is overloaded', 'type': 'server_error'}})
+            return
+        promts = request['prompt'] if isinstance(request['prompt'], list) else [request['prompt']]
+        max_tokens = request.get('max_tokens', 16)
+        texts = [fake_completion(promt, max_tokens) for promt in promts]
+        prompt_tokens = sum(count_tokens(promt) for promt in promts)
+        completion_tokens = sum(count_tokens(text) for text in texts) * request.get('best_of', 1)
+        latency = self.latency.sample(max(count_tokens(text) for text in texts))
+        self.stats.add(prompts=len(promts), prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        if request.get('stream'):
+            self.stream_completion(handler, request, texts, latency)
+            return
+        time.sleep(latency)
+        handler._send(200, {
+            **self._header(request),
+            'choices': [
+                {'text': text, 'index': index, 'logprobs': None, 'finish_reason': 'stop'}
+                for index, text in enumerate(texts)
+            ],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _header(self, request: dict) -> dict:
+        return {
+            'id': f'cmpl-{uuid.uuid4().hex}',
+            'object': 'text_completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+        }
+
+    def stream_completion(self, handler: _Handler, request: dict, texts: list[str], latency: float) -> None:
+        """
+        Server-sent events with one word of every choice per event, spread evenly over `latency`;
+        the body ends with `data: [DONE]` and the connection closing, like the real endpoint.
+        """
+        header = self._header(request)
+        pieces = [text.split(' ') for text in texts]
+        steps = max(len(words) for words in pieces)
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.end_headers()
+        for step in range(steps):
+            time.sleep(latency / steps)
+            for index, words in enumerate(pieces):
+                if step < len(words):
+                    choice = {'text': (' ' if step else '') + words[step], 'index': index, 'logprobs': None,
+                              'finish_reason': 'stop' if step == len(words) - 1 else None}
+                    event = {**header, 'choices': [choice]}
+                    handler.wfile.write(f'data: {json.dumps(event)}\n\n'.encode('utf-8'))
+            handler.wfile.flush()
+        handler.wfile.write(b'data: [DONE]\n\n')
+        handler.wfile.flush()
+
+    def __enter__(self) -> 'FakeOpenAIServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main(port: int = 8000, median: float = 1.0, sigma: float = 0.5, rate_limit_rate: float = 0.0,
+         error_rate: float = 0.0):
+    """
+    Serves the fake Completion endpoint until interrupted; export OPENAI_API_BASE to its url.
+    """
+    server = FakeOpenAIServer(port, Latency(median, sigma), rate_limit_rate, error_rate)
+    print(f'OPENAI_API_BASE={server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats.as_dict()))
+
+
+if __name__ == '__main__':
+    Fire(main)
@@ -0,0 +1,150 @@
+import json
+import math
+import os
+import shutil
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.synthetic import amazon_transcript
+
+
+class _ClientError(Exception):
+    pass
+
+
+class _Exceptions:
+    BadRequestException = _ClientError
+    ConflictException = _ClientError
+
+
+class FakeTranscribeClient:
+    """
+    Stand-in for boto3.client('transcribe'). Jobs complete `duration` seconds after they are
+    started with a synthetic transcript of `minutes` of speech served by `server`.
+    """
+
+    exceptions = _Exceptions
+
+    def __init__(self, server: FakeOpenAIServer, duration: float = 1.0, minutes: float = 10, failure_rate: float = 0.0):
+        self.server = server
+        self.duration = duration
+        self.minutes = minutes
+        self.failure_rate = failure_rate
+        self.jobs: dict[str, dict] = {}
+        self.calls = {'start_transcription_job': 0, 'get_transcription_job': 0}
+        self._lock = threading.Lock()
+
+    def start_transcription_job(self, TranscriptionJobName: str, **kwargs) -> dict:
+        with self._lock:
+            self.calls['start_transcription_job'] += 1
+            if TranscriptionJobName in self.jobs:
+                raise self.exceptions.ConflictException(f'{TranscriptionJobName} already exists')
+            failed = self.server.random.random() < self.failure_rate
+            self.jobs[TranscriptionJobName] = {'started': time.monotonic(), 'failed': failed, 'request': kwargs}
+        return self.get_transcription_job(TranscriptionJobName=TranscriptionJobName)
+
+    def get_transcription_job(self, TranscriptionJobName: str) -> dict:
+        with self._lock:
+            self.calls['get_transcription_job'] += 1
+            job = self.jobs.get(TranscriptionJobName)
+            if job is None:
+                raise self.exceptions.BadRequestException(f'{TranscriptionJobName} not found')
+            description = {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': 'IN_PROGRESS'}
+            if time.monotonic() - job['started'] >= self.duration:
+                if job['failed']:
+                    description.update(TranscriptionJobStatus='FAILED', FailureReason='Injected failure')
+                else:
+                    file_name = f'{TranscriptionJobName}.json'
+                    if file_name not in self.server.files:
+                        transcript = amazon_transcript(self.minutes, seed=zlib.crc32(TranscriptionJobName.encode()))
+                        self.server.files[file_name] = json.dumps(transcript).encode('utf-8')
+                    description.update(TranscriptionJobStatus='COMPLETED',
+                                       Transcript={'TranscriptFileUri': f'{self.server.base_url}/files/{file_name}'})
+            return {'TranscriptionJob': description}
+
+
+class FakeBlob:
+    def __init__(self, bucket: 'FakeBucket', name: str):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def path(self) -> Path:
+        return self.bucket.root / self.name
+
+    def exists(self, client=None) -> bool:
+        return self.path.exists()
+
+    def upload_from_filename(self, filename: str, **kwargs) -> None:
+        self.bucket.client.uploads += 1
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(filename, self.path)
+
+    def download_to_filename(self, filename: str, **kwargs) -> None:
+        shutil.copyfile(self.path, filename)
+
+
+class FakeBucket:
+    def __init__(self, client: 'FakeStorageClient', name: str):
+        self.client = client
+        self.name = name
+        self.root = client.root / name
+
+    def blob(self, name: str, **kwargs) -> FakeBlob:
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    """
+    Stand-in for google.cloud.storage.Client keeping objects under a local directory.
+    """
+
+    def __init__(self, root: str = 'artifacts/fake_gcs'):
+        self.root = Path(root)
+        self.uploads = 0
+
+    def bucket(self, name: str) -> FakeBucket:
+        return FakeBucket(self, name)
+
+    def get_bucket(self, name: str) -> FakeBucket:
+        return self.bucket(name)
+
+    def list_buckets(self) -> list[FakeBucket]:
+        return [self.bucket(path.name) for path in self.root.iterdir()] if self.root.exists() else []
+
+
+class FakeS3Client:
+    """
+    Stand-in for boto3.client('s3') keeping objects under a local directory. Counts uploads and
+    the multipart parts the transfer config would have split them into.
+    """
+
+    def __init__(self, root: str = 'artifacts/fake_s3'):
+        self.root = Path(root)
+        self.uploads = 0
+        self.parts = 0
+        self.heads = 0
+        self._lock = threading.Lock()
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        with self._lock:
+            self.heads += 1
+        path = self.root / Bucket / Key
+        if not path.exists():
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return {'ContentLength': path.stat().st_size}
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, ExtraArgs: dict = None, Config=None, **kwargs) -> None:
+        size = os.path.getsize(Filename)
+        chunk_size = Config.multipart_chunksize if Config else size
+        with self._lock:
+            self.uploads += 1
+            self.parts += max(1, math.ceil(size / chunk_size)) if Config and size >= Config.multipart_threshold else 1
+        path = self.root / Bucket / Key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Filename, path)
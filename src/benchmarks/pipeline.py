@@ -0,0 +1,94 @@
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import openai
+from fire import Fire
+
+from benchmarks.fake_openai import FakeOpenAIServer, Latency
+from benchmarks.synthetic import write_vtt
+from text.pipeline import Pipeline
+from text.summarizers.engine import HedgePolicy, RequestEngine
+from text.summarizers.openai_adapter import OpenAIProcessor, PromtProcessor
+from text.zoom.processor import ZoomTranscriptionProcessor
+from utils.cache import configure_cache
+
+DURATIONS = (10, 60, 240, 480)
+
+
+def run_once(transcript_path: Path, server: FakeOpenAIServer, concurrency: int, hedge: float = None,
+             hedge_budget: float = 0.1, hedge_min_samples: int = 5) -> dict:
+    before = server.stats.as_dict()
+    policy = HedgePolicy(hedge, budget=hedge_budget, min_samples=hedge_min_samples) if hedge else None
+    engine = RequestEngine(concurrency=concurrency, backoff_base=0.1, hedge=policy)
+    pipeline = Pipeline([
+        ZoomTranscriptionProcessor(),
+        PromtProcessor(2, 400, 4001),
+        OpenAIProcessor(engine=engine),
+    ])
+    tracemalloc.start()
+    start = time.perf_counter()
+    summaries = pipeline(str(transcript_path))
+    wall_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    engine.close()
+    after = server.stats.as_dict()
+    result = {name: after[name] - before[name] for name in after}
+    result.update(
+        wall_time=round(wall_time, 3),
+        peak_memory_mb=round(peak / 2 ** 20, 2),
+        summaries=len(summaries),
+        stages={timing.name: round(timing.elapsed, 3) for timing in pipeline.timings},
+    )
+    if policy:
+        result.update(hedging=policy.as_dict())
+    return result
+
+
+def main(durations: tuple = DURATIONS, median: float = 0.5, sigma: float = 0.5, rate_limit_rate: float = 0.02,
+         error_rate: float = 0.01, concurrency: int = 10, seed: int = 0, output: str = 'bench_pipeline.json',
+         baseline: str = None, tolerance: float = 0.2, hedge: float = None, hedge_budget: float = 0.1,
+         hedge_min_samples: int = 5):
+    """
+    Runs Zoom -> PromtProcessor -> OpenAIProcessor on synthetic transcripts of `durations` minutes
+    against the local fake Completion endpoint, with a fresh cache for every run, and reports wall
+    time, calls, tokens and peak traced memory. With `baseline`, metrics more than `tolerance`
+    worse than the baseline report are listed as regressions. `hedge` runs with a `HedgePolicy` at
+    that latency percentile, with `hedge_budget` and `hedge_min_samples`.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeOpenAIServer(latency=Latency(median, sigma, seed=seed), rate_limit_rate=rate_limit_rate,
+                             error_rate=error_rate, seed=seed) as server:
+        openai.api_base = server.url
+        openai.api_key = openai.api_key or 'fake'
+        for minutes in durations:
+            configure_cache(path=f'{workdir}/cache_{minutes}.sqlite3')
+            transcript_path = write_vtt(Path(workdir) / f'{minutes}m.vtt', minutes, seed)
+            results[f'{minutes}m'] = result = run_once(transcript_path, server, concurrency, hedge, hedge_budget,
+                                                       hedge_min_samples)
+            print(f'{minutes:>4}m: {result["wall_time"]:8.2f}s wall, {result["calls"]:5} calls, '
+                  f'{result["prompt_tokens"]:8} prompt + {result["completion_tokens"]:7} completion tokens, '
+                  f'{result["peak_memory_mb"]:7.2f} MB peak')
+            if hedge:
+                print(f'       {result["hedging"]}')
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            previous = json.load(f)
+        regressions = [
+            f'{run}.{metric}: {previous[run][metric]} -> {result[metric]}'
+            for run, result in results.items() if run in previous
+            for metric in ('wall_time', 'calls', 'prompt_tokens', 'peak_memory_mb')
+            if result[metric] > previous[run][metric] * (1 + tolerance)
+        ]
+        print('Regressions:\n' + '\n'.join(regressions) if regressions else 'No regressions')
+        return len(regressions)
+
+
+if __name__ == '__main__':
+    Fire(main)
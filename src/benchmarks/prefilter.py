@@ -0,0 +1,65 @@
+import tempfile
+import time
+from pathlib import Path
+
+import openai
+from fire import Fire
+
+from benchmarks.fake_openai import FakeOpenAIServer, Latency
+from benchmarks.synthetic import write_vtt
+from text.pipeline import Pipeline
+from text.prefilter import ExtractiveFilter
+from text.summarizers.engine import RequestEngine
+from text.summarizers.openai_adapter import OpenAIProcessor, PromtProcessor
+from text.summarizers.tree import TreeSummarizer
+from text.zoom.processor import ZoomTranscriptionProcessor
+from utils.cache import configure_cache
+
+
+def run_once(transcript_path: str, server: FakeOpenAIServer, ratio: float, workdir: str) -> dict:
+    configure_cache(path=f'{workdir}/cache_{ratio}.sqlite3')
+    before = server.stats.as_dict()
+    engine = RequestEngine(concurrency=10, backoff_base=0.1)
+    prefilter = ExtractiveFilter(ratio) if ratio else None
+    pipeline = Pipeline([
+        ZoomTranscriptionProcessor(),
+        *([prefilter] if prefilter else []),
+        TreeSummarizer(PromtProcessor(2, 400, 4001), OpenAIProcessor(engine=engine)),
+    ])
+    start = time.perf_counter()
+    pipeline(transcript_path)
+    wall_time = time.perf_counter() - start
+    engine.close()
+    after = server.stats.as_dict()
+    result = {name: after[name] - before[name] for name in after}
+    result.update(wall_time=wall_time, tokens_saved=prefilter.tokens_saved if prefilter else 0)
+    return result
+
+
+def main(transcript_path: str = None, minutes: float = 120, ratios: tuple = (1.0, 0.8, 0.6, 0.4),
+         median: float = 0.5, seed: int = 0):
+    """
+    Summarizes a transcript (a synthetic `minutes` long meeting by default) against the fake
+    Completion endpoint without the pre-filter and with it at every compression ratio (1.0 only
+    removes filler and duplicates), and reports calls, prompt tokens, tokens saved and the speedup
+    over the unfiltered run.
+    """
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeOpenAIServer(latency=Latency(median, seed=seed), seed=seed) as server:
+        openai.api_base = server.url
+        openai.api_key = openai.api_key or 'fake'
+        if transcript_path is None:
+            transcript_path = str(write_vtt(Path(workdir) / f'{minutes}m.vtt', minutes, seed))
+        baseline = run_once(transcript_path, server, 0, workdir)
+        print(f'  no filter: {baseline["calls"]:4} calls, {baseline["prompt_tokens"]:8} prompt tokens, '
+              f'{baseline["wall_time"]:6.2f}s')
+        for ratio in ratios:
+            result = run_once(transcript_path, server, ratio, workdir)
+            print(f'ratio {ratio:.2f}: {result["calls"]:4} calls, {result["prompt_tokens"]:8} prompt tokens '
+                  f'({result["prompt_tokens"] / baseline["prompt_tokens"]:.0%}), {result["tokens_saved"]:7} '
+                  f'transcript tokens saved, {result["wall_time"]:6.2f}s, '
+                  f'{baseline["wall_time"] / result["wall_time"]:.2f}x')
+
+
+if __name__ == '__main__':
+    Fire(main)
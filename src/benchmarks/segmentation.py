@@ -0,0 +1,88 @@
+import logging
+import re
+import time
+from pathlib import Path
+
+from fire import Fire
+
+from benchmarks.synthetic import write_vtt
+from text.segmenter import SentenceSegmenter, split_sentences
+from text.utils import get_list_of_transcripts
+from text.zoom.processor import ZoomTranscriptionProcessor
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def punkt_tokenizer():
+    """
+    nltk's sent_tokenize with the trained English model, or an untrained Punkt tokenizer when the
+    model cannot be fetched (agreement numbers are then only indicative).
+    """
+    from nltk.tokenize.punkt import PunktSentenceTokenizer
+    from text.punkt import ensure_punkt, sent_tokenize
+    if ensure_punkt():
+        return sent_tokenize
+    logging.warning('Punkt model unavailable, comparing against an untrained Punkt tokenizer')
+    return PunktSentenceTokenizer().tokenize
+
+
+def boundaries(sentences: list[str]) -> set[int]:
+    # offsets into the text with all whitespace removed, comparable across joins
+    offsets, position = set(), 0
+    for sentence in sentences:
+        position += len(WHITESPACE.sub('', sentence))
+        offsets.add(position)
+    return offsets
+
+
+def agreement(candidate: list[str], reference: list[str]) -> dict:
+    found, expected = boundaries(candidate), boundaries(reference)
+    common = len(found & expected)
+    precision = common / len(found) if found else 0.0
+    recall = common / len(expected) if expected else 0.0
+    return {'precision': precision, 'recall': recall,
+            'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0}
+
+
+def timed(function, *args) -> tuple[list[str], float]:
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(path: str = None, minutes: float = 240, workers: int = 4, repeat: int = 3):
+    """
+    Sentence segmentation of the transcripts under `path` (a synthetic `minutes` long meeting by
+    default): time of Punkt over the joined text, of the regex splitter and of the cue aware
+    segmenter with and without a `workers` process pool, and boundary agreement with Punkt.
+    """
+    if path is None:
+        path = str(write_vtt(Path('artifacts/benchmarks') / f'synthetic_{minutes}m.vtt', minutes))
+    lines = [line for transcript in get_list_of_transcripts(path) for line in ZoomTranscriptionProcessor()(transcript)]
+    joined = '\n'.join(lines)
+    punkt = punkt_tokenizer()
+    pool = SentenceSegmenter(workers=workers)
+    pool(lines[:1])  # start the workers outside the timing
+    runs = {
+        'punkt (joined)': lambda: punkt(joined),
+        'regex (joined)': lambda: split_sentences(joined),
+        'cues + regex': lambda: SentenceSegmenter()(lines),
+        f'cues + regex, {workers} workers': lambda: pool(lines),
+    }
+    results = {}
+    for name, run in runs.items():
+        sentences, elapsed = min((timed(run) for _ in range(repeat)), key=lambda result: result[1])
+        results[name] = sentences
+        print(f'{name:>28}: {len(sentences):7} sentences, {elapsed * 1000:8.1f} ms, '
+              f'{len(lines) / elapsed:10.0f} lines/s')
+    pool.close()
+    reference = results['punkt (joined)']
+    for name, sentences in results.items():
+        if name != 'punkt (joined)':
+            scores = agreement(sentences, reference)
+            print(f'{name:>28} vs punkt: precision {scores["precision"]:.3f}, recall {scores["recall"]:.3f}, '
+                  f'f1 {scores["f1"]:.3f}')
+
+
+if __name__ == '__main__':
+    Fire(main)
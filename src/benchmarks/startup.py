@@ -0,0 +1,59 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from fire import Fire
+
+SOURCE = Path(__file__).resolve().parent.parent
+HEAVY = ('openai', 'nltk', 'boto3', 'botocore', 'requests', 'numpy', 'tiktoken', 'google.cloud')
+PROBE = 'import sys, time; start = time.perf_counter(); import {module}; ' \
+        'print(time.perf_counter() - start); print(",".join(m for m in {heavy!r} if m in sys.modules))'
+
+
+def cold_import(module: str) -> tuple[float, float, list[str]]:
+    """
+    Imports `module` in a fresh interpreter; returns the process wall time, the import time
+    and the heavy dependencies it loaded.
+    """
+    env = dict(os.environ, PYTHONPATH=str(SOURCE))
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)], env=env, check=True,
+                            capture_output=True, text=True).stdout.split('\n')
+    return time.perf_counter() - start, float(output[0]), [name for name in output[1].split(',') if name]
+
+
+def slowest_imports(module: str, limit: int = 10) -> list[tuple[int, str]]:
+    env = dict(os.environ, PYTHONPATH=str(SOURCE))
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], env=env, check=True,
+                            capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines()[1:]:
+        _, cumulative, name = line.split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main(modules: tuple = ('main', 'streamlit_app', 'text.summarizers.tree'), repeat: int = 5, top: int = 8):
+    """
+    Cold start of the entry points: median interpreter wall time and import time over `repeat`
+    fresh processes, the heavy dependencies each one pulls in and its `top` slowest imports.
+    """
+    for module in modules:
+        try:
+            runs = [cold_import(module) for _ in range(repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f'{module}: import failed\n{e.stderr}')
+            continue
+        wall = statistics.median(run[0] for run in runs)
+        imported = statistics.median(run[1] for run in runs)
+        print(f'{module}: {wall * 1000:.0f} ms process, {imported * 1000:.0f} ms import, '
+              f'heavy: {", ".join(runs[0][2]) or "none"}')
+        for cumulative, name in slowest_imports(module, top):
+            print(f'    {cumulative / 1000:8.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    Fire(main)
@@ -0,0 +1,86 @@
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from fire import Fire
+
+from audio.amazon.subtitles import create_subtitle
+from benchmarks.synthetic import amazon_transcript
+
+
+class LegacyItem:
+    """
+    The per-word object model create_subtitle used before the columnar reader.
+    """
+
+    def __init__(self, type, alternatives, start_time=None, end_time=None):
+        self.start_time = None if start_time is None else float(start_time)
+        self.end_time = None if end_time is None else float(end_time)
+        self._type = type
+        self.alternatives = [dict(alternative, confidence=float(alternative['confidence'])) for alternative in alternatives]
+        self.speaker_label = None
+
+
+def legacy_create_subtitle(path: str) -> list:
+    with open(path, 'r') as f:
+        response = json.load(f)
+    items_dict, items = {}, []
+    for item in response['results']['items']:
+        i = LegacyItem(**item)
+        items_dict[i.start_time] = i
+        items.append(i)
+    for segment in response['results']['speaker_labels']['segments']:
+        for item in segment['items']:
+            items_dict[float(item['start_time'])].speaker_label = segment['speaker_label']
+    result = [items[0]]
+    for item in items[1:]:
+        if item.start_time is None:
+            result[-1].alternatives.extend(item.alternatives)
+            continue
+        if result[-1].speaker_label == item.speaker_label and item.start_time - result[-1].start_time < 5:
+            result[-1].alternatives.extend(item.alternatives)
+            result[-1].end_time = item.end_time
+            continue
+        result.append(item)
+    return result
+
+
+def measure(function, *args) -> tuple:
+    # timed and traced separately, tracemalloc slows allocation heavy code down
+    gc.collect()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(result), elapsed, peak / 2 ** 20
+
+
+def main(transcript_path: str = None, minutes: tuple = (60, 240, 480)):
+    """
+    Compares parse time and peak traced memory of the streaming columnar reader with the legacy
+    json.load + object per word implementation on Transcribe results of `minutes` length.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = [transcript_path] if transcript_path else []
+        for length in ([] if transcript_path else minutes):
+            path = Path(workdir) / f'{length}m.json'
+            with open(path, 'w') as f:
+                json.dump(amazon_transcript(length), f)
+            paths.append(str(path))
+        for path in paths:
+            size = Path(path).stat().st_size / 2 ** 20
+            for name, function in [('legacy', legacy_create_subtitle), ('columnar', create_subtitle)]:
+                turns, elapsed, peak = measure(function, path)
+                print(f'{Path(path).name} ({size:.1f} MB) {name:>8}: {turns:6} turns, {elapsed:6.2f}s, {peak:8.1f} MB peak')
+
+
+if __name__ == '__main__':
+    Fire(main)
@@ -0,0 +1,80 @@
+import random
+from pathlib import Path
+
+SPEAKERS = ['Andre Willi', 'Maria Lopez', 'Sam Chen', 'Priya Natarajan', 'Tom Becker']
+WORDS = (
+    'we need to ship the release by friday and the benefits plan covers dental coverage travel insurance '
+    'pension retirement budget roadmap customers onboarding metrics pipeline latency review design '
+    'hiring quarter revenue support incident migration database dashboard feedback priorities'
+).split()
+FILLERS = ['Um, can you hear me?', "You're on mute.", 'Okay.', 'Yeah, yeah.', 'Sorry, go ahead.']
+
+
+def format_vtt_time(seconds: float) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}'
+
+
+def sentence(rng: random.Random) -> str:
+    if rng.random() < 0.1:
+        return rng.choice(FILLERS)
+    words = rng.choices(WORDS, k=rng.randint(6, 22))
+    return ' '.join(words).capitalize() + rng.choice('..?')
+
+
+def write_vtt(path: Path, minutes: float, seed: int = 0) -> Path:
+    """
+    Writes a Zoom style WebVTT transcript of roughly `minutes` of speech.
+    """
+    rng = random.Random(seed)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('WEBVTT\n\n')
+        start, index = 0.0, 1
+        while start < minutes * 60:
+            duration = rng.uniform(1.5, 9)
+            f.write(f'{index}\n{format_vtt_time(start)} --> {format_vtt_time(start + duration)}\n')
+            f.write(f'{rng.choice(SPEAKERS)}: {sentence(rng)}\n\n')
+            start += duration + rng.uniform(0, 1)
+            index += 1
+    return path
+
+
+def amazon_transcript(minutes: float, seed: int = 0, speakers: int = 3) -> dict:
+    """
+    An Amazon Transcribe result document with speaker labels for roughly `minutes` of speech.
+    """
+    rng = random.Random(seed)
+    items, segments, transcript = [], [], []
+    start = 0.0
+    while start < minutes * 60:
+        speaker = f'spk_{rng.randrange(speakers)}'
+        segment_start, segment_items = start, []
+        for word in sentence(rng).split():
+            content, punctuation = word.rstrip('.,?'), word[len(word.rstrip('.,?')):]
+            end = start + rng.uniform(0.15, 0.6)
+            times = {'start_time': f'{start:.2f}', 'end_time': f'{end:.2f}'}
+            items.append(dict(times, type='pronunciation',
+                              alternatives=[{'confidence': f'{rng.uniform(0.6, 1):.4f}', 'content': content}]))
+            segment_items.append(dict(times, speaker_label=speaker))
+            transcript.append(content)
+            if punctuation:
+                items.append({'type': 'punctuation', 'alternatives': [{'confidence': '0.0', 'content': punctuation}]})
+            start = end + rng.uniform(0, 0.1)
+        segments.append({'start_time': f'{segment_start:.2f}', 'end_time': f'{start:.2f}',
+                         'speaker_label': speaker, 'items': segment_items})
+        start += rng.uniform(0.2, 1.5)
+    return {
+        'jobName': f'synthetic-{minutes}m',
+        'accountId': '000000000000',
+        'results': {
+            'transcripts': [{'transcript': ' '.join(transcript)}],
+            'speaker_labels': {'speakers': speakers, 'segments': segments},
+            'items': items,
+        },
+        'status': 'COMPLETED',
+    }
@@ -0,0 +1,83 @@
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import Iterator
+
+DEFAULT_URL = 'http://127.0.0.1:8765'
+
+
+def service_url() -> str:
+    return os.getenv('SUMMARIZATION_SERVICE_URL', DEFAULT_URL)
+
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f'{status}: {message}')
+        self.status = status
+
+
+class ServiceClient:
+    """
+    Thin client of the summarization service (`python main.py serve`), standard library only.
+    """
+
+    def __init__(self, url: str = None, timeout: float = 30):
+        self.url = (url or service_url()).rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: dict = None, timeout: float = None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(f'{self.url}{path}', data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            return urllib.request.urlopen(request, timeout=timeout or self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            raise ServiceError(e.code, message) from None
+
+    def _json(self, method: str, path: str, body: dict = None):
+        with self._request(method, path, body) as response:
+            return json.loads(response.read())
+
+    def health(self) -> dict:
+        return self._json('GET', '/health')
+
+    def submit(self, transcript_path: str = None, text: str = None, priority: str = 'normal', **options) -> dict:
+        """
+        Queues a transcript, by a path the service can read or by its text; returns the job.
+        """
+        return self._json('POST', '/jobs', dict(options, transcript_path=transcript_path, text=text,
+                                                  priority=priority))
+
+    def status(self, job_id: str) -> dict:
+        return self._json('GET', f'/jobs/{job_id}')
+
+    def events(self, job_id: str, since: int = 0) -> Iterator[dict]:
+        """
+        Follows the job's events (status, summary and text) until it finishes.
+        """
+        # the service sends a keep-alive line at least every 15 seconds
+        with self._request('GET', f'/jobs/{job_id}/events?since={since}', timeout=max(self.timeout, 60)) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+    def result(self, job_id: str) -> list[str]:
+        with self._request('GET', f'/jobs/{job_id}/result') as response:
+            body = json.loads(response.read())
+            if response.status == 202:
+                raise ServiceError(202, f'Job {job_id} is {body["status"]}')
+        return body['notes']
+
+    def wait(self, job_id: str, interval: float = 1.0) -> list[str]:
+        """
+        Polls the job until it finishes and returns its notes.
+        """
+        while self.status(job_id)['status'] not in ('done', 'failed'):
+            time.sleep(interval)
+        return self.result(job_id)
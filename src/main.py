@@ -1,33 +1,202 @@
+import logging
+import os
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
 from fire import Fire
-from text.export_processors import TextExportProcessor
+from text.export_processors import LiveNotes, TextExportProcessor
+from text.manifest import ManifestLocks, RunManifest
+from text.pipeline import Pipeline
+from text.prefilter import ExtractiveFilter
+from text.segmenter import SentenceSegmenter
+from text.summarizers.engine import HedgePolicy, RequestEngine
 from text.summarizers.openai_adapter import OpenAIProcessor, PromtProcessor
+from text.summarizers.tree import TreeSummarizer
+from text.utils import get_list_of_transcripts
+from utils.metrics import instrumented
+from utils.similarity import configure_similarity
 from text.zoom.processor import ZoomTranscriptionProcessor
 
+PARAMS = {'best_of': 2, 'max_tokens': 400, 'limit': 4001}
+
 
-def process_transcript(transcript_path: str = "./artifacts/GMT20220414-171026_Recording.transcript.vtt") -> None:
+def run_transcript(transcript_path: str, manifest: RunManifest, notes_path: str = 'meetings_notes.txt',
+                   engine: RequestEngine = None, segmenter: SentenceSegmenter = None,
+                   batch_tokens: int = 0, on_summary: Callable[[int, int, str], None] = None,
+                   on_text: Callable[[int, int, str], None] = None) -> list[str]:
     """
-    Processes a transcript.
+    Summarizes one transcript. `on_summary` and `on_text` are passed to the `TreeSummarizer`; with
+    `on_text` the completions are streamed.
     """
-    best_of = 2
-    max_tokens = 400
-    limit = 4001
-    promt_processor = PromtProcessor(best_of, max_tokens, limit)
-    openai_processor = OpenAIProcessor()
-    txt_processor = TextExportProcessor()
-    pipeline = [
+    params = manifest.params
+    promt_processor = PromtProcessor(params['best_of'], params['max_tokens'], params['limit'], segmenter=segmenter)
+    openai_processor = OpenAIProcessor(engine=engine, batch_tokens=batch_tokens, streaming=on_text is not None)
+    txt_processor = TextExportProcessor(notes_path)
+    prefilter = ExtractiveFilter(params['prefilter']) if params.get('prefilter') else None
+    pipeline = Pipeline([
         ZoomTranscriptionProcessor(),
-        promt_processor, openai_processor,
-        promt_processor,
-        openai_processor,
+        *([prefilter] if prefilter else []),
+        TreeSummarizer(promt_processor, openai_processor, manifest=manifest, on_summary=on_summary, on_text=on_text),
         txt_processor
-    ]
-    args = transcript_path
-    for step in pipeline:
-        args = step(args)
-    print(args)
+    ])
+    notes = pipeline(transcript_path)
+    if prefilter:
+        logging.info(f'Pre-filter kept {prefilter.tokens_out} of {prefilter.tokens_in} transcript tokens, '
+                     f'{prefilter.tokens_saved} saved')
+    return notes
+
+
+def run_params(prefilter: float = None) -> dict:
+    # the ratio is part of the manifest parameters, so changing it starts a fresh run
+    return dict(PARAMS, prefilter=prefilter) if prefilter else PARAMS
+
+
+def process_transcript(transcript_path: str = "./artifacts/GMT20220414-171026_Recording.transcript.vtt",
+                       runs_path: str = 'runs', prefilter: float = None, similarity: float = None,
+                       batch_tokens: int = 0, stream: bool = False, hedge: float = None,
+                       hedge_budget: float = 0.1, hedge_min_samples: int = 5,
+                       metrics_path: str = None, profile_path: str = None) -> None:
+    """
+    Processes a transcript, checkpointing every chunk to a run manifest under `runs_path`.
+    `prefilter` is the share of transcript tokens the local extractive pre-filter keeps, off by default.
+    `similarity` reuses the cached summary of any earlier chunk at least that similar, e.g. 0.9.
+    `batch_tokens` sends chunks in multi-prompt requests of up to that many tokens, e.g. 16000.
+    `stream` prints every summary as its completion streams in, instead of batching.
+    `hedge` duplicates calls still running past that percentile of recent latencies, e.g. 95, for at
+    most `hedge_budget` of the calls, once `hedge_min_samples` latencies are known.
+    `metrics_path` writes a JSON and Prometheus run report, `profile_path` enables cProfile.
+    """
+    configure_similarity(similarity)
+    engine = RequestEngine(hedge=HedgePolicy(hedge, budget=hedge_budget, min_samples=hedge_min_samples)) \
+        if hedge else None
+    live = LiveNotes() if stream else None
+    with instrumented(metrics_path, profile_path):
+        manifest = RunManifest.for_transcript(transcript_path, run_params(prefilter), runs_path)
+        notes = run_transcript(transcript_path, manifest, engine=engine, batch_tokens=0 if stream else batch_tokens,
+                               on_summary=live.summary if live else None, on_text=live.text if live else None)
+    if engine:
+        engine.close()
+    if stream:
+        print()
+    print(notes)
+
+
+def resume(transcript_path: str, runs_path: str = 'runs') -> None:
+    """
+    Continues an interrupted process_transcript run from its manifest.
+    """
+    manifest = RunManifest.find(transcript_path, runs_path)
+    if manifest is None:
+        raise FileNotFoundError(f"No run manifest for {transcript_path} in {runs_path}")
+    print(f'Resuming {manifest.path} from stage {manifest.stage}')
+    notes = run_transcript(transcript_path, manifest)
+    print(notes)
+
+
+def batch_notes_path(transcript_path: str, root: Path, output_path: str) -> str:
+    """
+    The notes of a batch transcript, at its path relative to `root` under `output_path`, so files
+    with the same name in different directories do not overwrite each other.
+    """
+    relative = Path(transcript_path).relative_to(root)
+    notes_path = Path(output_path) / relative.parent / f'{relative.stem}.txt'
+    notes_path.parent.mkdir(parents=True, exist_ok=True)
+    return str(notes_path)
+
+
+def process_batch(path: str, pattern: str = '*.vtt', output_path: str = 'artifacts/notes', runs_path: str = 'runs',
+                  files: int = 8, concurrency: int = 10, requests_per_minute: float = 3000,
+                  tokens_per_minute: float = 250000, segment_workers: int = 0, prefilter: float = None,
+                  similarity: float = None, batch_tokens: int = 0, hedge: float = None,
+                  hedge_budget: float = 0.1, hedge_min_samples: int = 5,
+                  metrics_path: str = None, profile_path: str = None) -> None:
+    """
+    Summarizes every transcript in a directory or glob in one process. All files share one request
+    engine, so `concurrency` and the rate limits are global, and identical chunks are requested once.
+    `segment_workers` splits sentences in a shared process pool. With `similarity` a chunk reuses the
+    summary of an earlier near duplicate, e.g. from the last instance of a recurring meeting. Notes
+    are written to `output_path` as each file finishes, mirroring the directories under `path`.
+    `batch_tokens` groups the chunks of a level into multi-prompt requests of up to that many tokens.
+    `hedge` is the latency percentile after which a straggling call is duplicated, see process_transcript.
+    """
+    transcripts = get_list_of_transcripts(path, pattern)
+    configure_similarity(similarity)
+    Path(output_path).mkdir(parents=True, exist_ok=True)
+    engine = RequestEngine(concurrency, requests_per_minute, tokens_per_minute,
+                           hedge=HedgePolicy(hedge, budget=hedge_budget, min_samples=hedge_min_samples)
+                           if hedge else None)
+    segmenter = SentenceSegmenter(workers=segment_workers)
+
+    root = Path(path) if Path(path).is_dir() else \
+        Path(os.path.commonpath([Path(transcript).parent for transcript in transcripts] or ['.']))
+
+    manifest_locks = ManifestLocks()
+
+    def summarize(transcript_path: str) -> str:
+        notes_path = batch_notes_path(transcript_path, root, output_path)
+        # copies of a transcript in other directories share its manifest, they run one after the other
+        with manifest_locks(transcript_path, runs_path):
+            manifest = RunManifest.for_transcript(transcript_path, run_params(prefilter), runs_path)
+            run_transcript(transcript_path, manifest, notes_path, engine, segmenter, batch_tokens)
+        return notes_path
+
+    failed = []
+    try:
+        with instrumented(metrics_path, profile_path), ThreadPoolExecutor(max_workers=files) as executor:
+            futures = {executor.submit(summarize, transcript): transcript for transcript in transcripts}
+            for future in as_completed(futures):
+                try:
+                    print(f'{futures[future]} -> {future.result()}')
+                except Exception as e:
+                    logging.exception(f'{futures[future]} failed: {e}')
+                    failed.append(futures[future])
+    finally:
+        engine.close()
+        segmenter.close()
+    print(f'{len(transcripts) - len(failed)} of {len(transcripts)} transcripts summarized, '
+          f'{engine.deduplicated} duplicate chunks shared')
+    if failed:
+        print('Failed, rerun to resume:\n' + '\n'.join(failed))
+
+
+def serve(host: str = '127.0.0.1', port: int = 8765, workers: int = 2, queue_size: int = 64, concurrency: int = 10,
+          segment_workers: int = 0, hedge: float = None, hedge_budget: float = 0.1,
+          hedge_min_samples: int = 5) -> None:
+    """
+    Runs the summarization service, a local HTTP API with a job queue; see server.serve for all options.
+    """
+    from server import serve as run
+    run(host, port, workers, queue_size, concurrency, segment_workers=segment_workers, hedge=hedge,
+        hedge_budget=hedge_budget, hedge_min_samples=hedge_min_samples)
+
+
+def submit(transcript_path: str, url: str = None, priority: str = 'normal', prefilter: float = None,
+           batch_tokens: int = 0, stream: bool = False) -> None:
+    """
+    Summarizes a transcript in a running service (`serve`, or SUMMARIZATION_SERVICE_URL) and prints
+    the summaries as they arrive. `priority` is high, normal or low.
+    """
+    from client import ServiceClient
+    client = ServiceClient(url)
+    job = client.submit(str(Path(transcript_path).resolve()), priority=priority, prefilter=prefilter,
+                        batch_tokens=batch_tokens, stream=stream)
+    print(f'Job {job["id"]} is {job["status"]}')
+    live = LiveNotes()
+    for event in client.events(job['id']):
+        if event['event'] == 'text':
+            live.text(event['level'], event['index'], event['text'])
+        elif event['event'] == 'summary':
+            live.summary(event['level'], event['index'], event['text'])
+    print()
+    print(client.result(job['id']))
 
 
 if __name__ == '__main__':
     Fire({
         'process_transcript': process_transcript,
+        'resume': resume,
+        'process_batch': process_batch,
+        'serve': serve,
+        'submit': submit,
     })
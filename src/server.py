@@ -0,0 +1,361 @@
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from queue import Full, PriorityQueue
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from fire import Fire
+
+from main import run_params, run_transcript
+from text.manifest import ManifestLocks, RunManifest, file_digest, text_digest
+from text.segmenter import SentenceSegmenter
+from text.summarizers.engine import HedgePolicy, RequestEngine
+from utils.cache import make_key
+from utils.metrics import metrics
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+FINISHED = ('done', 'failed')
+
+
+class ServiceJob:
+    """
+    A transcript submitted to the service. Everything that happens to it is appended to `events`
+    (status changes, chunk summaries and, for streamed jobs, pieces of their text), so any number
+    of clients can follow it from any point.
+    """
+
+    def __init__(self, job_id: str, transcript_path: str, priority: str, prefilter: Optional[float],
+                 batch_tokens: int, stream: bool):
+        self.id = job_id
+        self.transcript_path = transcript_path
+        self.priority = priority
+        self.prefilter = prefilter
+        self.batch_tokens = batch_tokens
+        self.stream = stream
+        self.status = 'queued'
+        self.events: list[dict] = []
+        self.chunks = 0
+        self.notes: Optional[list[str]] = None
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.changed = threading.Condition()
+
+    def emit(self, event: dict, **changes) -> None:
+        with self.changed:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.events.append(event)
+            self.changed.notify_all()
+
+    def set_status(self, status: str, **changes) -> None:
+        self.emit({'event': 'status', 'status': status}, status=status, **changes)
+
+    def on_summary(self, level: int, index: int, text: str) -> None:
+        with self.changed:
+            self.emit({'event': 'summary', 'level': level, 'index': index, 'text': text},
+                      chunks=self.chunks + (level == 0))
+
+    def on_text(self, level: int, index: int, text: str) -> None:
+        self.emit({'event': 'text', 'level': level, 'index': index, 'text': text})
+
+    def wait_events(self, since: int, timeout: float = None) -> list[dict]:
+        """
+        Events after the first `since`, waiting up to `timeout` for new ones while the job runs.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: len(self.events) > since or self.status in FINISHED, timeout)
+            return self.events[since:]
+
+    def as_dict(self) -> dict:
+        job = {
+            'id': self.id,
+            'status': self.status,
+            'priority': self.priority,
+            'transcript_path': self.transcript_path,
+            'chunks': self.chunks,
+            'events': len(self.events),
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if self.error is not None:
+            job['error'] = self.error
+        return job
+
+
+class SummaryService:
+    """
+    Summarizes transcripts for any number of clients on `workers` long lived threads. All jobs
+    share one `RequestEngine` (its connections and rate limits), one sentence segmenter pool and
+    the warm in-process response cache. Jobs wait in a priority queue of at most `queue_size`;
+    submitting a transcript with the same options as a queued, running or finished job returns
+    that job, and a failed one is retried. Jobs of the same transcript with other options share its
+    run manifest, so they run one after the other.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 64, concurrency: int = 10,
+                 requests_per_minute: float = 3000, tokens_per_minute: float = 250000, segment_workers: int = 0,
+                 hedge: float = None, runs_path: str = 'runs', output_path: str = 'artifacts/notes',
+                 uploads_path: str = 'data/transcriptions', history: int = 1000, hedge_budget: float = 0.1,
+                 hedge_min_samples: int = 5):
+        self.engine = RequestEngine(concurrency, requests_per_minute, tokens_per_minute,
+                                    hedge=HedgePolicy(hedge, budget=hedge_budget, min_samples=hedge_min_samples)
+                                    if hedge else None)
+        self.segmenter = SentenceSegmenter(workers=segment_workers)
+        self.runs_path = runs_path
+        self.output_path = Path(output_path)
+        self.uploads_path = Path(uploads_path)
+        self.history = history
+        self.queue = PriorityQueue(queue_size)
+        self.jobs: OrderedDict[str, ServiceJob] = OrderedDict()
+        self._lock = threading.Lock()
+        self._manifest_locks = ManifestLocks()
+        self._sequence = itertools.count()
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.workers = [threading.Thread(target=self._work, name=f'summary-worker-{index}', daemon=True)
+                        for index in range(workers)]
+        for worker in self.workers:
+            worker.start()
+        metrics.register('service', self.stats)
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {
+            'queued': self.queue.qsize(),
+            'running': statuses.count('running'),
+            'jobs': len(statuses),
+            'engine_pending': self.engine.pending,
+        }
+
+    def submit(self, transcript_path: str = None, text: str = None, priority: str = 'normal',
+               prefilter: float = None, batch_tokens: int = 0, stream: bool = False) -> ServiceJob:
+        """
+        Queues a transcript given by a path on this machine or by its `text`. Raises queue.Full
+        when the queue is at capacity.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f'Unknown priority {priority}, expected one of {", ".join(PRIORITIES)}')
+        if text is not None:
+            transcript_path = self.uploads_path / f'{text_digest(text)[:16]}.vtt'
+            if not transcript_path.exists():
+                transcript_path.parent.mkdir(parents=True, exist_ok=True)
+                transcript_path.write_text(text, encoding='utf-8')
+        if transcript_path is None:
+            raise ValueError('Either transcript_path or text is required')
+        transcript_path = str(transcript_path)
+        # streamed completions are never batched
+        batch_tokens = 0 if stream else batch_tokens
+        job_id = make_key('job', (file_digest(transcript_path), run_params(prefilter), batch_tokens, stream), {})[:16]
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job.status != 'failed':
+                self.jobs.move_to_end(job_id)
+                return job
+            job = ServiceJob(job_id, transcript_path, priority, prefilter, batch_tokens, stream)
+            self.queue.put_nowait((PRIORITIES[priority], next(self._sequence), job))
+            self.jobs[job_id] = job
+            self._evict()
+        metrics.inc('service_jobs_submitted_total', priority=priority)
+        logging.info(f'Job {job_id} queued for {transcript_path} with {priority} priority')
+        return job
+
+    def _evict(self) -> None:
+        # forget the oldest finished jobs; their results stay in the cache and the run manifests
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[ServiceJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> list[ServiceJob]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def _work(self) -> None:
+        while True:
+            _, _, job = self.queue.get()
+            if job is None:
+                return
+            self._run(job)
+
+    def _run(self, job: ServiceJob) -> None:
+        job.set_status('running', started=time.time())
+        metrics.observe('service_queue_seconds', job.started - job.submitted, priority=job.priority)
+        try:
+            with self._manifest_locks(job.transcript_path, self.runs_path):
+                manifest = RunManifest.for_transcript(job.transcript_path, run_params(job.prefilter), self.runs_path)
+                notes = run_transcript(job.transcript_path, manifest, str(self.output_path / f'{job.id}.txt'),
+                                       self.engine, self.segmenter, job.batch_tokens, on_summary=job.on_summary,
+                                       on_text=job.on_text if job.stream else None)
+        except Exception as e:
+            logging.exception(f'Job {job.id} failed')
+            job.set_status('failed', error=f'{type(e).__name__}: {e}', finished=time.time())
+        else:
+            job.set_status('done', notes=notes, finished=time.time())
+        metrics.inc('service_jobs_total', status=job.status)
+        metrics.observe('service_job_seconds', job.finished - job.started)
+
+    def close(self) -> None:
+        # the stop markers sort before every job, so the workers stop after their current one
+        for _ in self.workers:
+            self.queue.put((-1, next(self._sequence), None))
+        for worker in self.workers:
+            worker.join()
+        self.engine.close()
+        self.segmenter.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'SummaryServer'
+
+    def log_message(self, format, *args):
+        logging.debug(f'{self.address_string()} {format % args}')
+
+    def _send(self, status: int, body, headers: dict = None, content_type: str = 'application/json') -> None:
+        payload = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, message: str, headers: dict = None) -> None:
+        self._send(status, {'error': message}, headers)
+
+    def _job(self, job_id: str) -> Optional[ServiceJob]:
+        job = self.server.service.get(job_id)
+        if job is None:
+            self._error(404, f'No job {job_id}')
+        return job
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        service = self.server.service
+        if parts == ['health']:
+            self._send(200, dict(service.stats(), status='ok', workers=len(service.workers)))
+        elif parts == ['metrics']:
+            self._send(200, metrics.to_prometheus(), content_type='text/plain; version=0.0.4')
+        elif parts == ['jobs']:
+            self._send(200, [job.as_dict() for job in service.list()])
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self._job(parts[1])
+            if job:
+                self._send(200, job.as_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+            job = self._job(parts[1])
+            if job is None:
+                return
+            if job.status == 'done':
+                self._send(200, {'id': job.id, 'notes': job.notes})
+            elif job.status == 'failed':
+                self._send(500, {'id': job.id, 'error': job.error})
+            else:
+                self._send(202, job.as_dict(), {'Retry-After': '1'})
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            since = parse_qs(url.query).get('since', ['0'])[0]
+            if not since.lstrip('-').isdigit():
+                self._error(400, f'since must be an integer, got {since!r}')
+                return
+            job = self._job(parts[1])
+            if job:
+                self._stream(job, max(0, int(since)))
+        else:
+            self._error(404, f'{url.path} not found')
+
+    def _stream(self, job: ServiceJob, since: int) -> None:
+        """
+        Newline delimited JSON events from `since` on, until the job finishes; the body ends
+        with the connection.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            while True:
+                events = job.wait_events(since, timeout=15)
+                # an empty line every 15 s tells dead clients apart from slow jobs
+                self.wfile.write(b''.join(json.dumps(event).encode('utf-8') + b'\n' for event in events) or b'\n')
+                self.wfile.flush()
+                since += len(events)
+                if job.status in FINISHED and since >= len(job.events):
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            logging.debug(f'Client left the events of job {job.id}')
+
+    def do_POST(self):
+        if urlparse(self.path).path.strip('/') != 'jobs':
+            self._error(404, f'{self.path} not found')
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            job = self.server.service.submit(**request)
+        except Full:
+            metrics.inc('service_jobs_rejected_total')
+            self._error(503, 'The job queue is full', {'Retry-After': '5'})
+        except (ValueError, TypeError, FileNotFoundError) as e:
+            self._error(400, str(e))
+        else:
+            self._send(200 if job.status in FINISHED else 202, job.as_dict())
+
+
+class SummaryServer(ThreadingHTTPServer):
+    """
+    Local JSON API of a `SummaryService`:
+    POST /jobs {transcript_path | text, priority, prefilter, batch_tokens, stream} queues a job,
+    GET /jobs/<id> polls it, GET /jobs/<id>/events?since=<n> streams its events as JSON lines,
+    GET /jobs/<id>/result returns the notes, GET /jobs, /health and /metrics describe the service.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service: SummaryService, host: str = '127.0.0.1', port: int = 8765):
+        super().__init__((host, port), _Handler)
+        self.service = service
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+
+def serve(host: str = '127.0.0.1', port: int = 8765, workers: int = 2, queue_size: int = 64, concurrency: int = 10,
+          requests_per_minute: float = 3000, tokens_per_minute: float = 250000, segment_workers: int = 0,
+          hedge: float = None, runs_path: str = 'runs', output_path: str = 'artifacts/notes',
+          hedge_budget: float = 0.1, hedge_min_samples: int = 5) -> None:
+    """
+    Runs the summarization service until interrupted. `workers` transcripts are summarized at a
+    time, all sharing `concurrency` OpenAI connections and the rate limits; at most `queue_size`
+    jobs wait. `hedge`, `hedge_budget` and `hedge_min_samples` are as in main.process_transcript.
+    Clients: `main.py submit`, the Streamlit app with SUMMARIZATION_SERVICE_URL set.
+    """
+    service = SummaryService(workers, queue_size, concurrency, requests_per_minute, tokens_per_minute,
+                             segment_workers, hedge, runs_path, output_path, hedge_budget=hedge_budget,
+                             hedge_min_samples=hedge_min_samples)
+    server = SummaryServer(service, host, port)
+    print(f'Serving on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    Fire(serve)
@@ -1,69 +1,165 @@
-import nltk
-
-nltk.download('punkt')
+import hashlib
+import logging
 import os
+import threading
+import time
 from pathlib import Path
+from typing import Optional
 
 import streamlit as st
 
+from text.manifest import RunManifest
+from text.pipeline import Pipeline
 from text.summarizers.openai_adapter import PromtProcessor, OpenAIProcessor
+from text.summarizers.tree import TreeSummarizer
 from text.zoom.processor import ZoomTranscriptionProcessor
 
+PARAMS = {'best_of': 1, 'max_tokens': 400, 'limit': 4001}
+
+
+class SummaryJob:
+    """
+    One transcript summarized in a background thread. `partial` collects the text of the first
+    level summaries as it streams in, `chunks` the completed ones; `promts` is set once the
+    reduce levels finish.
+    """
+
+    def __init__(self, transcript_path: str):
+        self.transcript_path = transcript_path
+        self.chunks: dict[int, str] = {}
+        self.partial: dict[int, str] = {}
+        self.promts: Optional[list[str]] = None
+        self.error: Optional[BaseException] = None
+        self.started = time.time()
+        self.thread = threading.Thread(target=self.run, name=f'summary-{Path(transcript_path).stem}', daemon=True)
+
+    @property
+    def done(self) -> bool:
+        return self.promts is not None or self.error is not None
+
+    def on_text(self, level: int, index: int, text: str) -> None:
+        if level == 0:
+            self.partial[index] = self.partial.get(index, '') + text
+
+    def on_summary(self, level: int, index: int, text: str) -> None:
+        if level == 0:
+            self.chunks[index] = text
+
+    def run(self) -> None:
+        try:
+            self.promts = process_transcript(self.transcript_path, self.on_summary, self.on_text)
+        except Exception as e:
+            logging.exception(f'Summarizing {self.transcript_path} failed')
+            self.error = e
+
+
+class RemoteJob(SummaryJob):
+    """
+    A SummaryJob run by the summarization service at SUMMARIZATION_SERVICE_URL and followed
+    through its event stream, so the app itself only renders.
+    """
 
-def process_transcript(transcript_path):
-    best_of = 1
-    max_tokens = 400
-    limit = 4001
-    promt_processor = PromtProcessor(best_of, max_tokens, limit)
-    openai_processor = OpenAIProcessor()
-    pipeline = [
+    def run(self) -> None:
+        from client import ServiceClient
+        try:
+            client = ServiceClient()
+            job = client.submit(str(Path(self.transcript_path).resolve()), stream=True)
+            for event in client.events(job['id']):
+                if event['event'] == 'text':
+                    self.on_text(event['level'], event['index'], event['text'])
+                elif event['event'] == 'summary':
+                    self.on_summary(event['level'], event['index'], event['text'])
+            self.promts = client.result(job['id'])
+        except Exception as e:
+            logging.exception(f'Summarizing {self.transcript_path} in the service failed')
+            self.error = e
+
+
+class JobRegistry:
+    """
+    Jobs by transcript content hash, shared by every rerun and session of the app. With
+    SUMMARIZATION_SERVICE_URL set they run in the summarization service instead of the app.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, SummaryJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, digest: str, transcript_path: str) -> SummaryJob:
+        with self._lock:
+            job = self.jobs.get(digest)
+            # a failed job is retried; its finished chunks come back from the cache and the manifest
+            if job is None or job.error is not None:
+                job_class = RemoteJob if os.getenv('SUMMARIZATION_SERVICE_URL') else SummaryJob
+                job = self.jobs[digest] = job_class(transcript_path)
+                job.thread.start()
+            return job
+
+
+@st.cache_resource
+def job_registry() -> JobRegistry:
+    return JobRegistry()
+
+
+def process_transcript(transcript_path, on_summary=None, on_text=None):
+    promt_processor = PromtProcessor(PARAMS['best_of'], PARAMS['max_tokens'], PARAMS['limit'])
+    openai_processor = OpenAIProcessor(streaming=on_text is not None)
+    manifest = RunManifest.for_transcript(transcript_path, PARAMS)
+    pipeline = Pipeline([
         ZoomTranscriptionProcessor(),
-        promt_processor, openai_processor,
-        promt_processor,
-        openai_processor,
-    ]
-    args = transcript_path
-    for step in pipeline:
-        args = step(args)
-    return args
+        TreeSummarizer(promt_processor, openai_processor, manifest=manifest, on_summary=on_summary,
+                       on_text=on_text),
+    ])
+    return pipeline(transcript_path)
 
 
 def file_uploader_component(parent_component):
     uploaded_file = parent_component.file_uploader("Transcription", type=['vtt'])
-    video_path = None
-    if uploaded_file is not None:
-        is_valid = True
+    if uploaded_file is None:
+        return False, None, None
+    content = uploaded_file.getbuffer()
+    digest = hashlib.sha256(content).hexdigest()
+    transcription_path = Path('data', 'transcriptions', f'{Path(uploaded_file.name).stem}-{digest[:12]}.vtt')
+    if not transcription_path.exists():
         with st.spinner(text='Uploading...'):
-            Path(os.path.join("data", "transcriptions")).mkdir(parents=True, exist_ok=True)
+            transcription_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(transcription_path, "wb") as f:
+                f.write(content)
+    return True, str(transcription_path), digest
+
 
-            with open(os.path.join("data", "transcriptions", uploaded_file.name), "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            video_path = f'data/transcriptions/{uploaded_file.name}'
-    else:
-        is_valid = False
-    return is_valid, video_path
+def render_chunks(job: SummaryJob):
+    chunks = dict(job.chunks)
+    partial = dict(job.partial)
+    st.caption(f'{len(chunks)} chunk summaries so far, {time.time() - job.started:.0f}s')
+    for index in sorted(chunks.keys() | partial.keys()):
+        st.markdown(chunks[index] if index in chunks else partial[index] + ' ▌')
 
 
 def main():
     st.title("TL;DR")
     st.sidebar.title("Features")
     info = st.container()
-    is_valid, transcription_path = file_uploader_component(st.sidebar)
+    is_valid, transcription_path, digest = file_uploader_component(st.sidebar)
     if is_valid:
-        st.session_state.transcription_path = transcription_path
+        job = job_registry().submit(digest, transcription_path)
         with info:
-            with st.spinner(text='Process Transcription'):
-                promts = process_transcript(st.session_state.transcription_path)
-                st.session_state.promts = promts
-            if 'promts' in st.session_state:
-                source_texts = []
-                for i, promt in enumerate(st.session_state.promts):
-                    source_texts.append(
-                        st.markdown(promt)
-                    )
-                st.download_button('Download tldr', '\n'.join(promts), file_name='tldr.txt')
-
-    pass
+            placeholder = st.empty()
+            # widget interactions stop this loop with a rerun; the job itself keeps going
+            while not job.done:
+                with placeholder.container():
+                    st.info('Processing transcription...')
+                    render_chunks(job)
+                time.sleep(0.25)
+            placeholder.empty()
+            if job.error is not None:
+                st.error(f'Processing failed: {job.error}')
+                return
+            for promt in job.promts:
+                st.markdown(promt)
+            st.download_button('Download tldr', '\n'.join(job.promts), file_name='tldr.txt')
+            with st.expander('Chunk summaries'):
+                render_chunks(job)
 
 
 if __name__ == '__main__':
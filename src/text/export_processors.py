@@ -1,10 +1,210 @@
+import json
+import sys
+import threading
+from collections import defaultdict, namedtuple
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO
+
 from text.processor import BaseProcessor
 
+# start_time and end_time are seconds, None for text without timing such as summaries
+Turn = namedtuple('Turn', ['start_time', 'end_time', 'speaker_label', 'content'])
+
+TIMED_FORMATS = ('srt', 'vtt')
+FORMATS = TIMED_FORMATS + ('txt', 'json')
+
+
+def to_milliseconds(seconds: float) -> int:
+    return int(round(seconds * 1000))
+
+
+def format_timestamp(milliseconds: int, separator: str = ',') -> str:
+    """
+    hh:mm:ss,mmm for SRT, hh:mm:ss.mmm for WebVTT; integer arithmetic only.
+    """
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02}:{minutes:02}:{seconds:02}{separator}{milliseconds:03}'
+
+
+class TranscriptExporter:
+    """
+    Writes speaker turns to several formats (srt, vtt, txt, json) in a single pass. Output is
+    collected per format and written with one writelines call every `batch_size` turns into
+    large buffered files.
+    """
+
+    def __init__(self, base_path: str, formats: Iterable[str] = ('srt',), batch_size: int = 512,
+                 buffering: int = 1 << 20):
+        self.formats = tuple(formats.split(',')) if isinstance(formats, str) else tuple(formats)
+        unknown = set(self.formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f'Unknown export formats {sorted(unknown)}, expected some of {FORMATS}')
+        self.paths = {format: Path(base_path).with_suffix(f'.{format}') for format in self.formats}
+        self.batch_size = batch_size
+        self.buffering = buffering
+        self.count = 0
+        self._files = {}
+        self._pending: dict[str, list[str]] = {format: [] for format in self.formats}
+
+    def __enter__(self) -> 'TranscriptExporter':
+        for format, path in self.paths.items():
+            self._files[format] = open(path, 'w', buffering=self.buffering)
+        if 'vtt' in self._pending:
+            self._pending['vtt'].append('WEBVTT\n\n')
+        if 'json' in self._pending:
+            self._pending['json'].append('[')
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, turn: Turn) -> None:
+        self.count += 1
+        speaker_prefix = f'{turn.speaker_label}: ' if turn.speaker_label else ''
+        if any(format in self._pending for format in TIMED_FORMATS):
+            if turn.start_time is None or turn.end_time is None:
+                raise ValueError(f'Turn {self.count} has no timing, it cannot be exported as {TIMED_FORMATS}')
+            start, end = to_milliseconds(turn.start_time), to_milliseconds(turn.end_time)
+            if 'srt' in self._pending:
+                self._pending['srt'].append(
+                    f'{self.count}\n{format_timestamp(start)} --> {format_timestamp(end)}\n'
+                    f'{speaker_prefix}{turn.content}\n\n')
+            if 'vtt' in self._pending:
+                self._pending['vtt'].append(
+                    f'{self.count}\n{format_timestamp(start, ".")} --> {format_timestamp(end, ".")}\n'
+                    f'{speaker_prefix}{turn.content}\n\n')
+        if 'txt' in self._pending:
+            self._pending['txt'].append(f'{speaker_prefix}{turn.content}\n')
+        if 'json' in self._pending:
+            record = {'start': turn.start_time, 'end': turn.end_time, 'speaker': turn.speaker_label,
+                      'text': turn.content}
+            self._pending['json'].append(('\n' if self.count == 1 else ',\n') + json.dumps(record, ensure_ascii=False))
+        if self.count % self.batch_size == 0:
+            self._drain()
+
+    def _drain(self) -> None:
+        for format, pending in self._pending.items():
+            if pending:
+                self._files[format].writelines(pending)
+                pending.clear()
+
+    def flush(self) -> None:
+        self._drain()
+        for f in self._files.values():
+            f.flush()
+
+    def close(self) -> None:
+        if not self._files:
+            return
+        if 'json' in self._pending:
+            self._pending['json'].append('\n]\n')
+        self._drain()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def export(self, turns: Iterable[Turn]) -> dict[str, Path]:
+        with self:
+            for turn in turns:
+                self.write(turn)
+        return self.paths
+
 
 class TextExportProcessor(BaseProcessor):
-    def __init__(self, file_name='meetings_notes.txt'):
+    """
+    Writes the summaries through a TranscriptExporter. Without `formats` a single file is written
+    to `file_name` as given, in the format of its suffix, or as text for any other suffix; with
+    `formats`, `file_name` is the base name of one file per format.
+    """
+
+    def __init__(self, file_name='meetings_notes.txt', formats: Optional[Iterable[str]] = None):
         self.file_name = file_name
+        self.exact = not formats
+        if formats:
+            self.formats = tuple(formats)
+        else:
+            suffix = Path(file_name).suffix.lstrip('.').lower()
+            self.formats = (suffix if suffix in FORMATS else 'txt',)
+
+    def exporter(self) -> TranscriptExporter:
+        exporter = TranscriptExporter(self.file_name, self.formats)
+        if self.exact:
+            exporter.paths[self.formats[0]] = Path(self.file_name)
+        return exporter
 
     def __call__(self, promts: list[str]) -> None:
-        with open(self.file_name, 'w') as f:
-            f.writelines('\n'.join(promts))
+        self.exporter().export(Turn(None, None, None, promt) for promt in promts)
+
+    def stream(self, promts: Iterable[str]) -> Iterator[str]:
+        with self.exporter() as exporter:
+            for promt in promts:
+                exporter.write(Turn(None, None, None, promt))
+                exporter.flush()
+                yield promt
+
+
+class LiveNotes:
+    """
+    Writes summaries to `output` while they stream in, for `TreeSummarizer`'s `on_text` and
+    `on_summary`. Chunks appear in order under a level/chunk heading: the text of the chunk being
+    written shows up as it arrives, the pieces of later chunks are held back until its turn.
+    """
+
+    def __init__(self, output: TextIO = None):
+        self.output = output or sys.stdout
+        self.level, self.index = 0, 0
+        self.written = 0
+        self.pieces: dict[tuple[int, int], list[str]] = defaultdict(list)
+        self.finished: set[tuple[int, int]] = set()
+        self._lock = threading.Lock()
+
+    def _write(self, text: str) -> None:
+        if not self.written:
+            self.output.write(f'\n[level {self.level}, chunk {self.index + 1}]\n')
+        self.output.write(text)
+        self.written += len(text)
+        self.output.flush()
+
+    def _advance(self) -> None:
+        # write out the held back chunks that are complete, then start on the next one
+        while (self.level, self.index) in self.finished:
+            self.pieces.pop((self.level, self.index), None)
+            self.index, self.written = self.index + 1, 0
+            held = ''.join(self.pieces.pop((self.level, self.index), []))
+            if held:
+                self._write(held)
+
+    def _start_level(self, level: int) -> None:
+        # a level only starts once the previous one is complete, so all held back text is final
+        while self.level < level:
+            for key in sorted(key for key in self.pieces if key[0] == self.level and key[1] > self.index):
+                self.index, self.written = key[1], 0
+                self._write(''.join(self.pieces[key]))
+            self.pieces = defaultdict(list, {key: value for key, value in self.pieces.items() if key[0] > self.level})
+            self.level, self.index, self.written = self.level + 1, 0, 0
+            self.output.write('\n')
+
+    def text(self, level: int, index: int, text: str) -> None:
+        with self._lock:
+            if level < self.level:
+                return
+            self._start_level(level)
+            if (level, index) == (self.level, self.index):
+                self._write(text)
+            else:
+                self.pieces[level, index].append(text)
+
+    def summary(self, level: int, index: int, text: str) -> None:
+        with self._lock:
+            if level < self.level:
+                return
+            self._start_level(level)
+            if (level, index) == (self.level, self.index):
+                self._write(text[self.written:])
+                self.finished.add((level, index))
+                self._advance()
+            else:
+                self.pieces[level, index] = [text]
+                self.finished.add((level, index))
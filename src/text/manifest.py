@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def manifest_path(transcript_path: str, runs_path: str = 'runs', digest: str = None) -> Path:
+    digest = digest or file_digest(transcript_path)
+    return Path(runs_path) / f'{Path(transcript_path).stem}-{digest[:12]}.json'
+
+
+class ManifestLocks:
+    """
+    One lock per manifest path. Transcripts with the same name and content share a manifest, so
+    runs of them in one process must not checkpoint it at the same time.
+    """
+
+    def __init__(self):
+        self._locks: dict[Path, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, transcript_path: str, runs_path: str = 'runs') -> threading.Lock:
+        path = manifest_path(transcript_path, runs_path)
+        with self._lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+
+class RunManifest:
+    """
+    Checkpoint of one transcript run: the parameters, the chunks of every summarization level
+    with their status and output, and the stage reached. Saved atomically, at most every
+    `save_interval` seconds while chunks complete, so a killed run resumes where it stopped.
+    """
+
+    def __init__(self, path: str, data: dict, save_interval: float = 1.0):
+        self.path = Path(path)
+        self.data = data
+        self.save_interval = save_interval
+        self._saved = 0.0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_transcript(cls, transcript_path: str, params: dict, runs_path: str = 'runs') -> 'RunManifest':
+        digest = file_digest(transcript_path)
+        path = manifest_path(transcript_path, runs_path, digest)
+        manifest = cls.load(path) if path.exists() else None
+        if manifest is None or manifest.data['params'] != params:
+            manifest = cls(path, {
+                'transcript': str(transcript_path),
+                'transcript_sha256': digest,
+                'params': params,
+                'created': time.time(),
+                'stage': 'started',
+                'levels': [],
+                'result': None,
+            })
+            manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, path: str) -> 'RunManifest':
+        with open(path, 'r') as f:
+            return cls(path, json.load(f))
+
+    @classmethod
+    def find(cls, transcript_path: str, runs_path: str = 'runs') -> Optional['RunManifest']:
+        path = manifest_path(transcript_path, runs_path)
+        return cls.load(path) if path.exists() else None
+
+    @property
+    def params(self) -> dict:
+        return self.data['params']
+
+    @property
+    def stage(self) -> str:
+        return self.data['stage']
+
+    @property
+    def result(self) -> Optional[list[str]]:
+        return self.data['result']
+
+    def set_stage(self, stage: str) -> None:
+        with self._lock:
+            self.data['stage'] = stage
+            self.save()
+
+    def finish(self, result: list[str], levels: int) -> None:
+        with self._lock:
+            del self.data['levels'][levels:]
+            self.data['result'] = result
+            self.data['stage'] = 'done'
+            self.save()
+
+    def _chunk(self, level: int, index: int) -> Optional[dict]:
+        levels = self.data['levels']
+        while len(levels) <= level:
+            levels.append({'chunks': []})
+        chunks = levels[level]['chunks']
+        while len(chunks) <= index:
+            chunks.append(None)
+        return chunks[index]
+
+    def output(self, level: int, index: int, promt: str) -> Optional[str]:
+        """
+        The recorded output of a chunk, or None if it has to be (re)requested. A chunk whose
+        prompt changed since it was recorded is reset.
+        """
+        with self._lock:
+            digest = text_digest(promt)
+            chunk = self._chunk(level, index)
+            if chunk is not None and chunk['sha256'] == digest and chunk['status'] == DONE:
+                return chunk['output']
+            self.data['levels'][level]['chunks'][index] = {
+                'sha256': digest, 'chars': len(promt), 'status': PENDING, 'output': None, 'error': None,
+            }
+            return None
+
+    def record(self, level: int, index: int, output: str = None, error: Exception = None) -> None:
+        with self._lock:
+            chunk = self.data['levels'][level]['chunks'][index]
+            chunk['status'] = DONE if error is None else FAILED
+            chunk['output'] = output
+            chunk['error'] = None if error is None else f'{type(error).__name__}: {error}'
+            if error is not None or time.monotonic() - self._saved > self.save_interval:
+                self.save()
+
+    def truncate(self, level: int, chunks: int) -> None:
+        with self._lock:
+            if level < len(self.data['levels']):
+                del self.data['levels'][level]['chunks'][chunks:]
+
+    def save(self) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._saved = time.monotonic()
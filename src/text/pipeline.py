@@ -0,0 +1,112 @@
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from typing import Iterable, Iterator
+
+from text.processor import BaseProcessor
+from utils.metrics import metrics
+
+StageTiming = namedtuple('StageTiming', ['name', 'items_in', 'items_out', 'first_output', 'elapsed'])
+
+_DONE = object()
+
+
+class _Stage:
+    def __init__(self, index: int, processor: BaseProcessor, source: Iterable, maxsize: int, stop: threading.Event):
+        self.name = f'{index}:{type(processor).__name__}'
+        self.processor = processor
+        self.source = source
+        self.output = queue.Queue(maxsize=maxsize)
+        self.stop = stop
+        self.error = None
+        self.items_in = 0
+        self.items_out = 0
+        self.first_output = None
+        self.elapsed = None
+        self.thread = threading.Thread(target=self.run, name=f'pipeline-{self.name}', daemon=True)
+
+    def inputs(self) -> Iterator:
+        for item in self.source:
+            self.items_in += 1
+            yield item
+
+    def put(self, item) -> bool:
+        while not self.stop.is_set():
+            try:
+                self.output.put(item, timeout=0.1)
+                metrics.max('queue_depth_max', self.output.qsize(), stage=self.name)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        try:
+            for item in self.processor.stream(self.inputs()):
+                if self.first_output is None:
+                    self.first_output = time.perf_counter() - start
+                self.items_out += 1
+                if not self.put(item):
+                    return
+        except BaseException as e:
+            self.error = e
+            self.stop.set()
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self.put(_DONE)
+
+    def __iter__(self) -> Iterator:
+        while True:
+            try:
+                item = self.output.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def timing(self) -> StageTiming:
+        return StageTiming(self.name, self.items_in, self.items_out, self.first_output, self.elapsed)
+
+
+class Pipeline:
+    """
+    Runs processors concurrently, one thread per stage, connected by bounded queues so that a
+    stage starts on the first outputs of the previous one instead of waiting for all of them.
+    """
+
+    def __init__(self, steps: list[BaseProcessor], maxsize: int = 64):
+        self.steps = steps
+        self.maxsize = maxsize
+        self.timings: list[StageTiming] = []
+
+    def iterate(self, source) -> Iterator:
+        stop = threading.Event()
+        stages, items = [], iter([source])
+        for index, step in enumerate(self.steps):
+            stage = _Stage(index, step, items, self.maxsize, stop)
+            stages.append(stage)
+            items = stage
+        for stage in stages:
+            stage.thread.start()
+        try:
+            yield from items
+        finally:
+            stop.set()
+            for stage in stages:
+                stage.thread.join()
+            self.timings = [stage.timing() for stage in stages]
+            for timing in self.timings:
+                logging.info(f'{timing.name}: {timing.items_in} in, {timing.items_out} out, '
+                             f'first output {timing.first_output or 0:.2f}s, total {timing.elapsed:.2f}s')
+        errors = [stage.error for stage in stages if stage.error is not None]
+        if errors:
+            raise errors[0]
+
+    def __call__(self, source) -> list:
+        return list(self.iterate(source))
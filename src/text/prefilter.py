@@ -0,0 +1,148 @@
+import re
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator, TYPE_CHECKING
+
+from text.processor import BaseProcessor
+from text.tokens import count_tokens
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+
+SPEAKER = re.compile(r'^[^:]{1,40}:\s+')
+FILLER_WORDS = re.compile(r'\b(?:u+m+|u+h+|e+r+m*|h+m+|mm+|you know|i mean|like,)(?:[,.]\s*|\s+|$)', re.IGNORECASE)
+SMALL_TALK = re.compile(
+    r"\b(?:can you (?:all )?(?:hear|see) me|can everyone (?:hear|see)|you'?re (?:on )?mute|you are muted|"
+    r"i was (?:on )?mute|(?:let me|i'?ll) share my screen|can you see my screen|is my screen visible|"
+    r"sorry,? go ahead|no,? you go ahead|you'?re breaking up|bad connection|hello,? hello)\b",
+    re.IGNORECASE,
+)
+WORD = re.compile(r'\w+')
+STOPWORDS = frozenset((
+    'a an and are as at be but by do does for from had has have he her him his i if in into is it its me my no not '
+    'of on or our she so that the their them then there these they this to too us was we were what when where which '
+    'who will with would yeah yes you your okay ok just really right well oh'
+).split())
+
+
+def normalize(text: str) -> str:
+    return ' '.join(WORD.findall(text.lower()))
+
+
+def clean_line(line: str) -> tuple[str, str]:
+    """
+    Splits off the speaker prefix and strips filler words; returns (prefix, text).
+    """
+    match = SPEAKER.match(line)
+    prefix, text = (line[:match.end()], line[match.end():]) if match else ('', line)
+    text = FILLER_WORDS.sub('', text).strip()
+    return prefix, text[:1].upper() + text[1:]
+
+
+def textrank(texts: list[str], damping: float = 0.85, iterations: int = 50) -> 'np.ndarray':
+    """
+    TF-IDF cosine similarity graph of the sentences, ranked with PageRank power iteration.
+    """
+    # numpy is only loaded when the pre-filter runs, not on every CLI start
+    import numpy as np
+    vocabulary: dict[str, int] = {}
+    rows, columns = [], []
+    for row, text in enumerate(texts):
+        for word in WORD.findall(text.lower()):
+            if word not in STOPWORDS:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(word, len(vocabulary)))
+    count = len(texts)
+    if not vocabulary:
+        return np.full(count, 1 / max(count, 1))
+    tf = np.zeros((count, len(vocabulary)))
+    np.add.at(tf, (rows, columns), 1)
+    idf = np.log((1 + count) / (1 + np.count_nonzero(tf, axis=0))) + 1
+    vectors = tf * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0)
+    weights = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, weights, out=np.full_like(similarity, 1 / count), where=weights > 0)
+    scores = np.full(count, 1 / count)
+    for _ in range(iterations):
+        updated = (1 - damping) / count + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated
+        scores = updated
+    return scores
+
+
+class ExtractiveFilter(BaseProcessor):
+    """
+    Local pre-filter for transcript lines ahead of `PromtProcessor`: strips filler words, drops
+    small talk, fragments shorter than `min_words` and lines repeated within the last `window`
+    lines, then keeps the TextRank-best lines of every `window` lines, in their original order,
+    until `ratio` of the remaining tokens is kept. Tokens in and out are reported to the metrics.
+    """
+
+    def __init__(self, ratio: float = 0.6, window: int = 300, min_words: int = 3):
+        if not 0 < ratio <= 1:
+            raise ValueError(f'ratio must be in (0, 1], got {ratio}')
+        self.ratio = ratio
+        self.window = window
+        self.min_words = min_words
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+    def __call__(self, lines: Iterable[str]) -> list[str]:
+        return list(self.stream(lines))
+
+    def _drop(self, reason: str) -> None:
+        metrics.inc('prefilter_lines_dropped_total', reason=reason)
+
+    def _clean(self, lines: Iterable[str]) -> Iterator[tuple[str, str]]:
+        recent, seen = deque(), set()
+        for line in lines:
+            tokens = count_tokens(line)
+            self.tokens_in += tokens
+            metrics.inc('prefilter_tokens_in_total', tokens)
+            prefix, text = clean_line(line.strip())
+            if SMALL_TALK.search(text):
+                self._drop('small_talk')
+                continue
+            key = normalize(text)
+            if len(key.split()) < self.min_words:
+                self._drop('short')
+                continue
+            if key in seen:
+                self._drop('duplicate')
+                continue
+            recent.append(key)
+            seen.add(key)
+            if len(recent) > self.window:
+                seen.discard(recent.popleft())
+            yield prefix, text
+
+    def _select(self, lines: list[tuple[str, str]]) -> list[str]:
+        import numpy as np
+        sizes = np.array([count_tokens(prefix + text) for prefix, text in lines])
+        keep = np.zeros(len(lines), dtype=bool)
+        budget, kept = self.ratio * sizes.sum(), 0
+        for index in np.argsort(-textrank([text for _, text in lines]), kind='stable'):
+            if kept >= budget:
+                break
+            keep[index] = True
+            kept += sizes[index]
+        metrics.inc('prefilter_lines_dropped_total', int(len(lines) - keep.sum()), reason='score')
+        return [prefix + text for (prefix, text), selected in zip(lines, keep) if selected]
+
+    def stream(self, lines: Iterable[str]) -> Iterator[str]:
+        cleaned = self._clean(lines)
+        while batch := list(islice(cleaned, self.window)):
+            for line in (self._select(batch) if self.ratio < 1 else [prefix + text for prefix, text in batch]):
+                tokens = count_tokens(line)
+                self.tokens_out += tokens
+                metrics.inc('prefilter_tokens_out_total', tokens)
+                yield line
@@ -1,7 +1,60 @@
+import functools
+import time
+from typing import Iterable, Iterator
+
+from utils.metrics import metrics
+
+
+def _timed_call(function, stage: str):
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        with metrics.timer('stage_seconds', stage=stage, method='call'):
+            return function(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _timed_stream(function, stage: str):
+    @functools.wraps(function)
+    def wrapper(self, items):
+        # time spent inside the stage only, not waiting on its consumer
+        iterator, busy = iter(function(self, items)), 0.0
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                busy += time.perf_counter() - start
+            metrics.inc('stage_items_total', stage=stage)
+            yield item
+        metrics.observe('stage_seconds', busy, stage=stage, method='stream')
+
+    return wrapper
+
+
 class BaseProcessor:
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if '__call__' in vars(cls):
+            cls.__call__ = _timed_call(vars(cls)['__call__'], cls.__name__)
+        if 'stream' in vars(cls):
+            cls.stream = _timed_stream(vars(cls)['stream'], cls.__name__)
+
     def __call__(self, *args, **kwargs):
         raise NotImplementedError
 
+    def stream(self, items: Iterable) -> Iterator:
+        """
+        Consumes the outputs of the previous pipeline stage as they are produced. The default
+        implementation waits for all of them and yields the batch result; stages that can work
+        incrementally override it.
+        """
+        result = self(list(items))
+        if result is not None:
+            yield from result
+
 
 class BaseTranscriptionProcessor(BaseProcessor):
     def __call__(self, transcription_path: str) -> list[str]:
@@ -11,3 +64,7 @@ class BaseTranscriptionProcessor(BaseProcessor):
         except FileNotFoundError:
             raise FileNotFoundError(f"File {transcription_path} not found")
         return transcriptions
+
+    def stream(self, transcription_paths: Iterable[str]) -> Iterator[str]:
+        for transcription_path in transcription_paths:
+            yield from self(transcription_path)
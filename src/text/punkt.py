@@ -0,0 +1,35 @@
+import functools
+import logging
+import os
+from pathlib import Path
+
+# project local copy of the tokenizer model, looked up before the user wide nltk_data directories
+NLTK_DATA = Path(os.getenv('SUMMARIZATION_NLTK_DATA', 'cache/nltk_data'))
+
+
+@functools.lru_cache(maxsize=None)
+def ensure_punkt() -> bool:
+    """
+    Makes the Punkt model available once per process: found locally it costs a directory lookup,
+    and it is only downloaded, into `NLTK_DATA`, when missing. Returns whether the model is usable.
+    """
+    import nltk
+    if str(NLTK_DATA) not in nltk.data.path:
+        nltk.data.path.insert(0, str(NLTK_DATA))
+    try:
+        nltk.data.find('tokenizers/punkt')
+        return True
+    except LookupError:
+        pass
+    logging.info(f'Punkt tokenizer not found, downloading it to {NLTK_DATA}')
+    NLTK_DATA.mkdir(parents=True, exist_ok=True)
+    if not nltk.download('punkt', download_dir=str(NLTK_DATA), quiet=True):
+        logging.error('Punkt tokenizer could not be downloaded')
+        return False
+    return True
+
+
+def sent_tokenize(text: str) -> list[str]:
+    from nltk import sent_tokenize as nltk_sent_tokenize
+    ensure_punkt()
+    return nltk_sent_tokenize(text)
@@ -0,0 +1,110 @@
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from utils.metrics import metrics
+
+# terminal punctuation, closing quotes or brackets, then the whitespace a boundary may fall in
+BOUNDARY = re.compile(r'[.!?…]+["\'”’)\]]*\s+')
+OPENING = '"\'“‘(['
+ABBREVIATIONS = frozenset((
+    'mr.', 'mrs.', 'ms.', 'dr.', 'prof.', 'sr.', 'jr.', 'st.', 'vs.', 'etc.', 'e.g.', 'i.e.', 'inc.', 'ltd.',
+    'co.', 'corp.', 'no.', 'approx.', 'dept.', 'est.', 'fig.', 'jan.', 'feb.', 'mar.', 'apr.', 'jun.', 'jul.',
+    'aug.', 'sep.', 'sept.', 'oct.', 'nov.', 'dec.', 'u.s.', 'u.k.', 'a.m.', 'p.m.',
+    'т.е.', 'т.к.', 'т.д.', 'г.', 'ул.',
+))
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Regex sentence splitter: breaks after terminal punctuation followed by a capitalised word or a
+    number, except after known abbreviations and single letter initials.
+    """
+    sentences, start = [], 0
+    for match in BOUNDARY.finditer(text):
+        end = match.end()
+        following = text[end:end + 1]
+        if following in OPENING:
+            following = text[end + 1:end + 2]
+        if not (following.isupper() or following.isdigit()):
+            continue
+        word = text[max(start, text.rfind(' ', start, match.start()) + 1):match.start() + 1].lower()
+        if word in ABBREVIATIONS or (len(word) == 2 and word[0].isalpha() and word != 'i.'):
+            continue
+        sentences.append(text[start:match.start() + len(match.group().rstrip())])
+        start = end
+    if start < len(text) and not text[start:].isspace():
+        sentences.append(text[start:].rstrip())
+    return sentences
+
+
+def split_lines(lines: list[str]) -> list[str]:
+    """
+    Every line, e.g. a Zoom cue, ends a sentence; the regex splits sentences inside it.
+    """
+    return [sentence for line in lines for sentence in split_sentences(line.strip())]
+
+
+def _punkt_lines(lines: list[str]) -> list[str]:
+    from text.punkt import sent_tokenize
+    return sent_tokenize('\n'.join(lines))
+
+
+def _batches(lines: Iterable[str], size: int) -> Iterator[list[str]]:
+    lines = iter(lines)
+    while batch := list(islice(lines, size)):
+        yield batch
+
+
+class SentenceSegmenter:
+    """
+    Splits transcript lines into sentences for packing. Cue boundaries come first (a cue never
+    shares a sentence with the next one), then `split_sentences` inside each cue. With `workers`
+    the batches are split in a process pool, which pays off for batch runs; `method='punkt'`
+    keeps the old behaviour of running Punkt over the joined text.
+    """
+
+    def __init__(self, method: str = 'regex', workers: int = 0, batch_size: int = 4096):
+        if method not in ('regex', 'punkt'):
+            raise ValueError(f'Unknown segmentation method {method}, expected regex or punkt')
+        self.method = method
+        self.workers = workers
+        self.batch_size = batch_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return self._pool
+
+    def __call__(self, lines: Iterable[str]) -> list[str]:
+        return list(self.segment(lines))
+
+    def segment(self, lines: Iterable[str]) -> Iterator[str]:
+        if self.method == 'punkt':
+            with metrics.timer('sent_tokenize_seconds'):
+                sentences = _punkt_lines(list(lines))
+            yield from sentences
+            return
+        if self.workers:
+            # at most 2 * workers batches in flight, so the input is still consumed lazily
+            futures = deque()
+            for batch in _batches(lines, self.batch_size):
+                futures.append(self.pool.submit(split_lines, batch))
+                if len(futures) >= 2 * self.workers:
+                    yield from futures.popleft().result()
+            while futures:
+                yield from futures.popleft().result()
+            return
+        for batch in _batches(lines, self.batch_size):
+            with metrics.timer('sent_tokenize_seconds'):
+                sentences = split_lines(batch)
+            yield from sentences
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
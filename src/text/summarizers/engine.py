@@ -0,0 +1,343 @@
+import functools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Optional
+
+from utils.metrics import metrics
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    # openai is imported on first use, not when the engine module is loaded
+    import openai.error
+    return (
+        openai.error.RateLimitError,
+        openai.error.ServiceUnavailableError,
+        openai.error.Timeout,
+        openai.error.APIConnectionError,
+        openai.error.TryAgain,
+    )
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket refilled continuously at `rate_per_minute`.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Blocks until `amount` tokens are available and takes them. Returns the time spent waiting.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float) -> None:
+        """
+        Corrects a previous estimate once the real cost is known; the balance may go negative.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai.error
+    if isinstance(error, retryable_errors()):
+        return True
+    if isinstance(error, openai.error.APIError):
+        return error.http_status is None or error.http_status >= 500
+    return False
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after', headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+class HedgePolicy:
+    """
+    When a call is still running after the `percentile` latency of the last `window` calls, a
+    duplicate is sent and the first response wins, as long as hedges stay under `budget` of all
+    calls. The calls of a stage start together, so a call that starts before `min_samples`
+    latencies are known waits for them (or for its own response) and is then judged by them;
+    this way a single meeting of about 10 calls per stage can hedge its stragglers.
+    """
+
+    def __init__(self, percentile: float = 95, window: int = 200, budget: float = 0.1, min_samples: int = 5):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+        self.extra_tokens = 0
+        self._lock = threading.Lock()
+        self._sampled = threading.Condition(self._lock)
+
+    def delay(self, call: Future) -> Optional[float]:
+        """
+        How long `call`, started just now, may run before it is hedged. Waits until `min_samples`
+        latencies are known, and returns None if `call` finishes first.
+        """
+        with self._lock:
+            self.calls += 1
+        call.add_done_callback(self._notify)
+        with self._lock:
+            self._sampled.wait_for(lambda: call.done() or len(self.latencies) >= self.min_samples)
+            if len(self.latencies) < self.min_samples:
+                return None
+            latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))]
+
+    def _notify(self, _: Future) -> None:
+        with self._lock:
+            self._sampled.notify_all()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.calls:
+                return False
+            self.hedges += 1
+        metrics.inc('openai_hedges_total')
+        return True
+
+    def record(self, seconds: float, hedge_won: bool = False) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+            self.wins += hedge_won
+            self._sampled.notify_all()
+        if hedge_won:
+            metrics.inc('openai_hedge_wins_total')
+
+    def wasted(self, tokens: int) -> None:
+        with self._lock:
+            self.extra_tokens += tokens
+        metrics.inc('openai_hedge_extra_tokens_total', tokens)
+
+    def as_dict(self) -> dict:
+        return {'calls': self.calls, 'hedges': self.hedges, 'wins': self.wins, 'extra_tokens': self.extra_tokens}
+
+
+class RequestEngine:
+    """
+    Persistent thread pool for OpenAI calls with requests/min and tokens/min limits and
+    jittered exponential backoff on 429, 5xx and transport errors. The openai client keeps
+    one HTTP session per thread, so long lived workers also keep their connections alive.
+    With a `hedge` policy, straggling calls are duplicated and the first response is used.
+    """
+
+    def __init__(self, concurrency: int = 10, requests_per_minute: float = 3000,
+                 tokens_per_minute: float = 250000, max_retries: int = 6, backoff_base: float = 1.0,
+                 backoff_max: float = 60.0, request_timeout: Optional[float] = 120, hedge: HedgePolicy = None):
+        self.concurrency = concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='openai',
+                                            initializer=_bind, initargs=(self,))
+        self._inflight: dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self.deduplicated = 0
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self.hedge = hedge
+        self._hedges = None
+        if hedge is not None:
+            # primaries and hedges, plus losers that are still running
+            self._hedges = ThreadPoolExecutor(max_workers=3 * concurrency, thread_name_prefix='openai-hedge',
+                                              initializer=_bind, initargs=(self,))
+            metrics.register('hedging', hedge.as_dict)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return delay
+
+    def execute(self, function: Callable, *args, tokens: float = 0, **kwargs):
+        """
+        Calls `function` in the current thread under the engine limits, retrying transient errors.
+        """
+        attempt = 0
+        while True:
+            waited = self.requests.acquire(1) + self.tokens.acquire(tokens)
+            metrics.observe('rate_limit_wait_seconds', waited)
+            start = time.perf_counter()
+            try:
+                response = self._call(function, args, kwargs, tokens)
+            except Exception as e:
+                metrics.observe('openai_request_seconds', time.perf_counter() - start, status=type(e).__name__)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    metrics.inc('openai_failures_total', error=type(e).__name__)
+                    raise
+                delay = self.backoff(attempt, e)
+                attempt += 1
+                metrics.inc('openai_retries_total', error=type(e).__name__)
+                logging.warning(f'{type(e).__name__}: {e}. Retry {attempt}/{self.max_retries} in {delay:.1f}s')
+                time.sleep(delay)
+                continue
+            metrics.observe('openai_request_seconds', time.perf_counter() - start, status='ok')
+            usage = response.get('usage') if hasattr(response, 'get') else None
+            if usage and 'total_tokens' in usage:
+                self.tokens.adjust(usage['total_tokens'] - tokens)
+                metrics.inc('openai_prompt_tokens_total', usage.get('prompt_tokens', 0))
+                metrics.inc('openai_completion_tokens_total', usage.get('completion_tokens', 0))
+            return response
+
+    def _call(self, function: Callable, args: tuple, kwargs: dict, tokens: float):
+        """
+        One attempt, hedged when the policy allows it. A running HTTP call can not be interrupted,
+        so a losing call is only cancelled if it has not started; otherwise it runs to the end and
+        its tokens are recorded as the cost of the hedge. Streams are never hedged.
+        """
+        if self.hedge is None or kwargs.get('stream'):
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        primary = self._hedges.submit(function, *args, **kwargs)
+        delay = self.hedge.delay(primary)
+        done, _ = wait([primary], timeout=None if delay is None else max(0.0, start + delay - time.perf_counter()))
+        if done or not self.hedge.allow():
+            response = primary.result()
+            self.hedge.record(time.perf_counter() - start)
+            return response
+        logging.debug(f'Hedging a call running for {time.perf_counter() - start:.1f}s')
+        hedge = self._hedges.submit(self._hedged, function, args, kwargs, tokens)
+        done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        winner = primary if primary in done and primary.exception() is None else next(iter(done))
+        if winner.exception() is not None:
+            # the first call failed, the other one may still succeed
+            other = hedge if winner is primary else primary
+            wait([other])
+            if other.exception() is None:
+                winner = other
+        loser = hedge if winner is primary else primary
+        loser.cancel()
+        loser.add_done_callback(self._wasted)
+        response = winner.result()
+        self.hedge.record(time.perf_counter() - start, hedge_won=winner is hedge)
+        return response
+
+    def _hedged(self, function: Callable, args: tuple, kwargs: dict, tokens: float):
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+        return function(*args, **kwargs)
+
+    def _wasted(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        response = future.result()
+        usage = response.get('usage') if hasattr(response, 'get') else None
+        if usage:
+            self.hedge.wasted(usage.get('total_tokens', 0))
+
+    def submit(self, function: Callable, *args, **kwargs) -> Future:
+        future = self._executor.submit(function, *args, **kwargs)
+        with self._pending_lock:
+            self.pending += 1
+            metrics.max('engine_pending_max', self.pending)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        with self._pending_lock:
+            self.pending -= 1
+
+    def submit_once(self, key: str, function: Callable, *args, **kwargs) -> Future:
+        """
+        Like submit, but callers asking for a `key` that is already in flight share its future.
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                metrics.inc('openai_deduplicated_total')
+                return future
+            future = self.submit(function, *args, **kwargs)
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def claim(self, key: str) -> tuple[Future, bool]:
+        """
+        The future of a `key` already in flight and False, or a new future registered under `key` and
+        True. The caller of a claimed key must resolve its future; until then `submit_once` and other
+        claims of that key share it.
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                metrics.inc('openai_deduplicated_total')
+                return future, False
+            future = self._inflight[key] = Future()
+        future.add_done_callback(lambda _: self._forget(key))
+        return future, True
+
+    def _forget(self, key: str) -> None:
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+
+    def map(self, function: Callable, items: Iterable) -> list:
+        futures = [self.submit(function, item) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        if self._hedges is not None:
+            self._hedges.shutdown(wait=True)
+
+
+_local = threading.local()
+_default_engine: Optional[RequestEngine] = None
+_default_lock = threading.Lock()
+
+
+def _bind(engine: RequestEngine) -> None:
+    _local.engine = engine
+
+
+def default_engine() -> RequestEngine:
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            _default_engine = RequestEngine()
+        return _default_engine
+
+
+def current_engine() -> RequestEngine:
+    """
+    The engine owning the calling worker thread, or the process wide default one.
+    """
+    return getattr(_local, 'engine', None) or default_engine()
@@ -1,19 +1,34 @@
+import functools
 import logging
-import os
-
-import openai
-from joblib import delayed, Parallel
-from nltk import sent_tokenize
-from openai.openai_object import OpenAIObject
+import time
+from collections import deque
+from concurrent.futures import Future
+from queue import Queue
+from typing import Callable, Iterable, Iterator, TYPE_CHECKING
 
 from text.processor import BaseProcessor
+from text.segmenter import SentenceSegmenter
+from text.summarizers.engine import current_engine, default_engine, RequestEngine
+from text.tokens import count_tokens
+from utils.cache import default_store, make_key
+from utils.metrics import metrics
+from utils.similarity import SimilarityIndex, similarity_index
 from utils.utils import cache, Config
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+if TYPE_CHECKING:
+    from openai.openai_object import OpenAIObject
 
 
 class OpenAIProcessor(BaseProcessor):
-    def __init__(self, config: Config = None):
+    """
+    Requests a completion for every prompt. With `batch_tokens` the prompts missing from the cache
+    are grouped into multi-prompt Completion calls of at most that many prompt and completion tokens.
+    With `streaming` completions arrive as server-sent events and their text is passed on piece by
+    piece, see `submit` and `partials`; streaming needs `best_of=1` and excludes batching.
+    """
+
+    def __init__(self, config: Config = None, engine: RequestEngine = None, batch_tokens: int = 0,
+                 streaming: bool = False):
         if config is None:
             config = Config(
                 engine="text-davinci-002",
@@ -24,42 +39,252 @@ class OpenAIProcessor(BaseProcessor):
                 best_of=1,
                 max_tokens=400
             )
+        if streaming and batch_tokens:
+            raise ValueError('Streaming and batching can not be combined')
+        if streaming and config.best_of != 1:
+            raise ValueError(f'Streamed completions need best_of=1, got {config.best_of}')
         self.config = config
+        self.engine = engine
+        self.batch_tokens = batch_tokens
+        self.streaming = streaming
 
     def __call__(self, promts: list[str]) -> list[str]:
-        responses = request_open_ai(promts, self.config)
-        texts = [response['choices'][0]['text'] for response in responses]
+        logging.info('Requesting OpenAI notes')
+        futures = list(self.submit(promts))
+        texts = [response_text(future.result()) for future in futures]
         return texts
 
+    def submit(self, promts: Iterable[str], on_text: Callable[[int, str], None] = None) -> Iterator[Future]:
+        """
+        Yields a future per prompt, in input order, once the request it waits on is scheduled.
+        `on_text(position, text)` receives the completion of the prompt at `position` as it
+        streams in, or in one piece when it completes, from the engine's threads.
+        """
+        engine = self.engine or default_engine()
+        if self.streaming:
+            for position, promt in enumerate(promts):
+                callback = functools.partial(on_text, position) if on_text else None
+                yield engine.submit(openai_stream_request, promt, self.config, callback)
+            return
+        futures = submit_batches(engine, promts, self.config, self.batch_tokens) if self.batch_tokens else \
+            (submit_request(engine, promt, self.config) for promt in promts)
+        for position, future in enumerate(futures):
+            if on_text:
+                future.add_done_callback(functools.partial(_completed, on_text, position))
+            yield future
+
+    def partials(self, promts: Iterable[str]) -> Iterator[tuple[int, str]]:
+        """
+        Yields (position, text) pieces of all the completions in the order they arrive.
+        """
+        pieces = Queue()
+        futures = list(self.submit(promts, lambda position, text: pieces.put((position, text))))
+        for future in futures:
+            future.add_done_callback(lambda _: pieces.put(None))
+        finished = 0
+        while finished < len(futures):
+            piece = pieces.get()
+            if piece is None:
+                finished += 1
+            else:
+                yield piece
+        for future in futures:
+            future.result()
+
+    def stream(self, promts: Iterable[str]) -> Iterator[str]:
+        """
+        Submits prompts as they arrive and yields their completions in input order.
+        """
+        engine = self.engine or default_engine()
+        pending = deque()
+        for future in self.submit(promts):
+            pending.append(future)
+            while pending and (pending[0].done() or len(pending) > 2 * engine.concurrency):
+                yield response_text(pending.popleft().result())
+        while pending:
+            yield response_text(pending.popleft().result())
+
 
 class PromtProcessor(BaseProcessor):
-    def __init__(self, best_of, max_tokens, limit):
+    """
+    Packs sentences into prompts of at most `limit - best_of * max_tokens` tokens, leaving room
+    for the completion. `overlap` trailing sentences of a prompt are repeated at the start of the next.
+    Sentences come from `segmenter`, by default the cue aware regex `SentenceSegmenter`.
+    """
+
+    def __init__(self, best_of, max_tokens, limit, overlap: int = 0, segmenter: SentenceSegmenter = None):
         self.best_of = best_of
         self.max_tokens = max_tokens
         self.limit = limit
+        self.overlap = overlap
+        self.segmenter = segmenter or SentenceSegmenter()
 
-    def __call__(self, promts: list[str]) -> list[str]:
-        promt = '\n'.join(promts)
-        sentences = sent_tokenize(promt)
-        promts = [sentences[0]]
-        for line in sentences[1:]:
-            if len(promts[-1]) + len(line) + self.best_of * self.max_tokens < self.limit:
-                promts[-1] += line
-            else:
-                promts.append(line)
-        return promts
+    @property
+    def budget(self) -> int:
+        return self.limit - self.best_of * self.max_tokens
+
+    def __call__(self, promts: Iterable[str]) -> list[str]:
+        return list(self.pack(self.segmenter.segment(promts)))
+
+    def stream(self, promts: Iterable[str]) -> Iterator[str]:
+        return self.pack(self.segmenter.segment(promts))
+
+    def pack(self, sentences: Iterable[str], budget: int = None) -> Iterator[str]:
+        budget = budget or self.budget
+        chunk, sizes, size = [], [], 0
+        for sentence in sentences:
+            for piece, tokens in self._pieces(sentence, budget):
+                if chunk and size + tokens > budget:
+                    yield ' '.join(chunk)
+                    chunk, sizes = self._carry(chunk, sizes, tokens, budget)
+                    size = sum(sizes)
+                chunk.append(piece)
+                sizes.append(tokens)
+                size += tokens
+        if chunk:
+            yield ' '.join(chunk)
 
+    def _carry(self, chunk: list[str], sizes: list[int], incoming: int, budget: int) -> tuple[list[str], list[int]]:
+        if not self.overlap:
+            return [], []
+        chunk, sizes = chunk[-self.overlap:], sizes[-self.overlap:]
+        while sizes and sum(sizes) + incoming > budget:
+            chunk, sizes = chunk[1:], sizes[1:]
+        return chunk, sizes
 
-def request_open_ai(promts, config: Config, n_jobs=10) -> list:
+    def _pieces(self, sentence: str, budget: int) -> Iterator[tuple[str, int]]:
+        # sentences are joined with a space, which BPE merges into the following word
+        tokens = count_tokens(' ' + sentence)
+        if tokens <= budget:
+            yield sentence, tokens
+            return
+        words, size = [], 0
+        for word in sentence.split():
+            word_tokens = count_tokens(' ' + word)
+            if words and size + word_tokens > budget:
+                yield ' '.join(words), size
+                words, size = [], 0
+            words.append(word)
+            size += word_tokens
+        if words:
+            yield ' '.join(words), size
+
+
+def request_open_ai(promts, config: Config, engine: RequestEngine = None) -> list:
     logging.info('Requesting OpenAI notes')
-    responses = Parallel(n_jobs=n_jobs)(delayed(openai_request)(promt, config) for promt in promts)
-    return responses
+    if engine is None:
+        engine = default_engine()
+    futures = [submit_request(engine, promt, config) for promt in promts]
+    return [future.result() for future in futures]
+
+
+def submit_request(engine: RequestEngine, promt: str, config: Config) -> Future:
+    """
+    Schedules an `openai_request`; identical prompts already in flight, e.g. from another
+    transcript of a batch, share one request.
+    """
+    return engine.submit_once(openai_request.cache_key(promt, config), openai_request, promt, config)
+
+
+def _completed(on_text: Callable[[int, str], None], position: int, future: Future) -> None:
+    if future.exception() is None:
+        on_text(position, response_text(future.result()))
+
+
+def submit_batches(engine: RequestEngine, promts: Iterable[str], config: Config, batch_tokens: int) -> Iterator[Future]:
+    """
+    Like `submit_request` for every prompt, but the prompts that are not cached are sent together,
+    in multi-prompt requests of at most `batch_tokens`. The responses are still cached per prompt.
+    Every pending prompt is claimed in the engine's in-flight map, so identical prompts, from this
+    or another transcript and batched or not, share one request.
+    """
+    store = default_store()
+    batch: dict[str, tuple[str, Future]] = {}
+    waiting: list[Future] = []
+    size = 0
+    try:
+        for promt in promts:
+            key = openai_request.cache_key(promt, config)
+            future, claimed = engine.claim(key)
+            waiting.append(future)
+            if not claimed:
+                continue
+            response = cached_response(store, key, promt, config)
+            if response is not None:
+                future.set_result(response)
+                if not batch:
+                    yield from waiting
+                    waiting = []
+                continue
+            tokens = request_tokens(promt + config.key_phrase, config)
+            if batch and size + tokens > batch_tokens:
+                engine.submit(run_batch, batch, config)
+                # the future of this prompt goes with the next batch
+                batch, size, ready, waiting = {}, 0, waiting[:-1], waiting[-1:]
+                yield from ready
+            batch[key] = promt, future
+            size += tokens
+    finally:
+        # claimed prompts are always sent, even when the caller stops early, or they would never resolve
+        if batch:
+            engine.submit(run_batch, batch, config)
+    yield from waiting
+
+
+def cached_response(store, key: str, promt: str, config: Config):
+    response = store.get(key, None)
+    if response is None:
+        index = similarity_index()
+        response = similar_response(index, promt, config) if index is not None else None
+        if response is not None:
+            store.put(key, response)
+    metrics.inc('cache_hits_total' if response is not None else 'cache_misses_total', function='openai_request')
+    return response
+
+
+def run_batch(batch: dict[str, tuple[str, Future]], config: Config) -> None:
+    """
+    Sends a batch from `submit_batches`, caches every response under its own prompt's key and
+    resolves the prompt futures.
+    """
+    try:
+        responses = openai_batch_request([promt for promt, _ in batch.values()], config)
+    except Exception as e:
+        for _, future in batch.values():
+            future.set_exception(e)
+        return
+    store = default_store()
+    index = similarity_index()
+    for (key, (promt, future)), response in zip(batch.items(), responses):
+        store.put(key, response)
+        if index is not None:
+            index.add(promt, key, config_namespace(config))
+        future.set_result(response)
+
+
+def response_text(response) -> str:
+    return response['choices'][0]['text']
+
+
+def request_tokens(promt: str, config: Config) -> int:
+    return count_tokens(promt) + config.best_of * config.max_tokens
 
 
 @cache
-def openai_request(promt: str, config: Config) -> None:
+def openai_request(promt: str, config: Config) -> 'OpenAIObject':
+    import openai
+    index = similarity_index()
+    if index is not None:
+        response = similar_response(index, promt, config)
+        if response is not None:
+            return response
+    text = promt
     promt = promt + config.key_phrase
-    response = openai.Completion.create(
+    engine = current_engine()
+    response = engine.execute(
+        openai.Completion.create,
+        tokens=request_tokens(promt, config),
+        request_timeout=engine.request_timeout,
         engine=config.engine,
         prompt=promt,
         temperature=config.temperature,
@@ -69,11 +294,120 @@ def openai_request(promt: str, config: Config) -> None:
         frequency_penalty=config.frequency_penalty,
         presence_penalty=config.presence_penalty,
     )
+    if index is not None:
+        index.add(text, openai_request.cache_key(text, config), config_namespace(config))
+    return response
+
+
+def openai_batch_request(promts: list[str], config: Config) -> list['OpenAIObject']:
+    """
+    One Completion call for several prompts. The choices are mapped back to their prompts by
+    index, and every prompt gets a response of its own, shaped like an `openai_request` one.
+    """
+    import openai
+    from openai.util import convert_to_openai_object
+    promts = [promt + config.key_phrase for promt in promts]
+    engine = current_engine()
+    response = engine.execute(
+        openai.Completion.create,
+        tokens=sum(request_tokens(promt, config) for promt in promts),
+        request_timeout=engine.request_timeout,
+        engine=config.engine,
+        prompt=promts,
+        temperature=config.temperature,
+        max_tokens=config.max_tokens,
+        best_of=config.best_of,
+        top_p=1,
+        frequency_penalty=config.frequency_penalty,
+        presence_penalty=config.presence_penalty,
+    )
+    metrics.inc('openai_batched_prompts_total', len(promts))
+    responses = [None] * len(promts)
+    for choice in response['choices']:
+        # usage stays with the whole request, the engine has already accounted it
+        responses[choice['index']] = convert_to_openai_object(
+            {**response, 'choices': [{**choice, 'index': 0}], 'usage': None})
+    if None in responses:
+        raise ValueError(f'{responses.count(None)} of {len(promts)} prompts got no choice in a batched response')
+    return responses
+
+
+def openai_stream_request(promt: str, config: Config, on_text: Callable[[str], None] = None) -> 'OpenAIObject':
+    """
+    `openai_request` over a server-sent event stream: every piece of the completion goes to
+    `on_text` as it arrives, and the assembled response is cached under the `openai_request` key.
+    Only the request is retried; a stream that breaks off fails the prompt.
+    """
+    store = default_store()
+    key = openai_request.cache_key(promt, config)
+    response = cached_response(store, key, promt, config)
+    if response is not None:
+        if on_text:
+            on_text(response_text(response))
+        return response
+    response = stream_completion(promt, config, on_text)
+    store.put(key, response)
+    index = similarity_index()
+    if index is not None:
+        index.add(promt, key, config_namespace(config))
+    return response
+
+
+def stream_completion(promt: str, config: Config, on_text: Callable[[str], None] = None) -> 'OpenAIObject':
+    import openai
+    from openai.util import convert_to_openai_object
+    promt = promt + config.key_phrase
+    engine = current_engine()
+    start = time.perf_counter()
+    events = engine.execute(
+        openai.Completion.create,
+        tokens=request_tokens(promt, config),
+        request_timeout=engine.request_timeout,
+        stream=True,
+        engine=config.engine,
+        prompt=promt,
+        temperature=config.temperature,
+        max_tokens=config.max_tokens,
+        top_p=1,
+        frequency_penalty=config.frequency_penalty,
+        presence_penalty=config.presence_penalty,
+    )
+    texts, event = [], None
+    for event in events:
+        text = event['choices'][0]['text']
+        if not texts:
+            metrics.observe('openai_first_token_seconds', time.perf_counter() - start)
+        texts.append(text)
+        if on_text and text:
+            on_text(text)
+    if event is None:
+        raise ValueError('The completion stream ended without any event')
+    metrics.observe('openai_stream_seconds', time.perf_counter() - start)
+    choice = {'text': ''.join(texts), 'index': 0, 'logprobs': None,
+              'finish_reason': event['choices'][0].get('finish_reason')}
+    return convert_to_openai_object({**event, 'choices': [choice], 'usage': None})
+
+
+def config_namespace(config: Config) -> str:
+    return make_key('config', tuple(config), {})
+
+
+def similar_response(index: SimilarityIndex, promt: str, config: Config):
+    """
+    The cached response of a near identical prompt sent with the same config, if there is one.
+    """
+    match = index.lookup(promt, config_namespace(config))
+    if match is None:
+        return None
+    response = default_store().get(match[0], None)
+    if response is not None:
+        logging.debug(f'Reusing the response of a prompt {match[1]:.0%} similar')
     return response
 
 
 @cache
-def key_points(promt: str, temperature=0.7, frequency_penalty=0, presence_penalty=0) -> OpenAIObject:
+def key_points(promt: str, temperature=0.7, frequency_penalty=0, presence_penalty=0) -> 'OpenAIObject':
+    import openai
     promt = "It is the part of the conversation zoom conversation:\n\n" + promt
     promt += '\n\nWhat are the key points of the conversation?'
     response = openai.Completion.create(
@@ -0,0 +1,134 @@
+import functools
+import logging
+import math
+from collections import namedtuple
+from concurrent.futures import Future, wait
+from typing import Callable, Iterable, Iterator, Union
+
+from text.manifest import RunManifest
+from text.processor import BaseProcessor
+from text.summarizers.openai_adapter import OpenAIProcessor, PromtProcessor, response_text
+from text.tokens import count_tokens
+
+Level = namedtuple('Level', ['calls', 'output_tokens'])
+
+
+class TreeSummarizer(BaseProcessor):
+    """
+    Map-reduce summarization: the transcript is packed and summarized once, then the summaries are
+    repacked and summarized again, level by level, until they fit in `target_tokens` (by default one
+    prompt). Every node is an ordinary cached `openai_request`, so reruns only pay for changed nodes.
+    With a `RunManifest` each node is also checkpointed as it completes, and one failed node no
+    longer discards the others: the level finishes, is recorded, and then the error is raised.
+    `on_summary(level, index, text)` is called as every node completes, from the engine's threads,
+    and `on_text(level, index, text)` with the pieces of its text as they arrive.
+    """
+
+    def __init__(self, promt_processor: PromtProcessor, openai_processor: OpenAIProcessor,
+                 target_tokens: int = None, max_levels: int = 8, manifest: RunManifest = None,
+                 on_summary: Callable[[int, int, str], None] = None,
+                 on_text: Callable[[int, int, str], None] = None):
+        self.promt_processor = promt_processor
+        self.openai_processor = openai_processor
+        self.target_tokens = target_tokens or promt_processor.budget
+        self.max_levels = max_levels
+        self.manifest = manifest
+        self.on_summary = on_summary
+        self.on_text = on_text
+        self.levels: list[Level] = []
+
+    def __call__(self, promts: Iterable[str]) -> list[str]:
+        return list(self.stream(promts))
+
+    def plan(self, summaries: list[str], sizes: list[int]) -> list[str]:
+        """
+        Groups summaries into the fewest prompts that fit the budget, spreading them evenly so
+        that no call at this level is much longer, and slower, than the others.
+        """
+        budget = self.promt_processor.budget
+        calls = max(1, math.ceil(sum(sizes) / budget))
+        # every chunk but the last overflows the average, so greedy packing needs at most `calls` chunks
+        balanced = min(budget, math.ceil(sum(sizes) / calls) + max(sizes))
+        chunks = list(self.promt_processor.pack(summaries, budget=balanced))
+        if len(chunks) <= calls:
+            return chunks
+        return list(self.promt_processor.pack(summaries))
+
+    def _record(self, level: int, index: int, future: Future) -> None:
+        error = future.exception()
+        self.manifest.record(level, index, None if error else response_text(future.result()), error)
+
+    def _notify(self, level: int, index: int, future: Future) -> None:
+        if future.exception() is None:
+            self.on_summary(level, index, response_text(future.result()))
+
+    def summarize(self, chunks: Iterable[str], level: int) -> list[str]:
+        """
+        Summarizes one level, submitting chunks as they are packed and skipping checkpointed ones.
+        """
+        results: list[Union[str, Future, None]] = []
+        indexes: list[int] = []
+
+        def missing() -> Iterator[str]:
+            for index, chunk in enumerate(chunks):
+                output = self.manifest.output(level, index, chunk) if self.manifest else None
+                if output is not None:
+                    if self.on_summary:
+                        self.on_summary(level, index, output)
+                    results.append(output)
+                    continue
+                results.append(None)
+                indexes.append(index)
+                yield chunk
+
+        def on_text(position: int, text: str) -> None:
+            self.on_text(level, indexes[position], text)
+
+        # futures come in chunk order, each after its chunk was taken from `missing`
+        submitted = self.openai_processor.submit(missing(), on_text if self.on_text else None)
+        for position, future in enumerate(submitted):
+            index = indexes[position]
+            results[index] = future
+            if self.manifest:
+                future.add_done_callback(functools.partial(self._record, level, index))
+            if self.on_summary:
+                future.add_done_callback(functools.partial(self._notify, level, index))
+        if self.manifest:
+            self.manifest.truncate(level, len(results))
+            self.manifest.set_stage(f'level {level}')
+        futures = [result for result in results if isinstance(result, Future)]
+        wait(futures)
+        if self.manifest:
+            # done callbacks may still be running when wait() returns
+            for index, result in enumerate(results):
+                if isinstance(result, Future):
+                    self._record(level, index, result)
+            self.manifest.save()
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            logging.error(f'{len(errors)} of {len(results)} chunks failed at level {level}')
+            raise errors[0]
+        return [result if isinstance(result, str) else response_text(result.result()) for result in results]
+
+    def stream(self, promts: Iterable[str]) -> Iterator[str]:
+        self.levels = []
+        if self.manifest and self.manifest.stage == 'done':
+            logging.info(f'{self.manifest.path} is complete, reusing its result')
+            yield from self.manifest.result
+            return
+        summaries = self.summarize(self.promt_processor.stream(promts), 0)
+        sizes = [count_tokens(summary) for summary in summaries]
+        self.levels.append(Level(len(summaries), sum(sizes)))
+        while sum(sizes) > self.target_tokens and len(self.levels) < self.max_levels:
+            chunks = self.plan(summaries, sizes)
+            if len(chunks) >= len(summaries):
+                logging.warning(f'Summaries no longer shrink at level {len(self.levels)}, stopping')
+                break
+            summaries = self.summarize(chunks, len(self.levels))
+            sizes = [count_tokens(summary) for summary in summaries]
+            self.levels.append(Level(len(chunks), sum(sizes)))
+        for index, level in enumerate(self.levels):
+            logging.info(f'Level {index}: {level.calls} calls, {level.output_tokens} output tokens')
+        if self.manifest:
+            self.manifest.finish(summaries, len(self.levels))
+        yield from summaries
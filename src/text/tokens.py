@@ -0,0 +1,45 @@
+import functools
+import logging
+import math
+import re
+
+# GPT-2 style pre-tokenization: contractions, words, numbers, punctuation runs, whitespace.
+PIECES = re.compile(r"'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?[^\s\w]+|\s+(?!\S)|\s+")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(name: str):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # tiktoken is optional and downloads its ranks on first use
+        logging.info(f'BPE encoding {name} unavailable ({type(e).__name__}), estimating token counts')
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximates the GPT-2/p50k token count: common words and punctuation runs are one token,
+    long words split roughly every four characters and numbers every three digits.
+    """
+    tokens = 0
+    for raw in PIECES.findall(text):
+        piece = raw.strip()
+        if not piece:
+            tokens += raw.count('\n')
+            continue
+        if piece.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif len(piece) > 6:
+            tokens += 1 + math.ceil((len(piece) - 6) / 4)
+        else:
+            tokens += 1
+    return tokens
+
+
+def count_tokens(text: str, encoding: str = 'p50k_base') -> int:
+    bpe = _encoding(encoding)
+    if bpe is None:
+        return estimate_tokens(text)
+    return len(bpe.encode(text, disallowed_special=()))
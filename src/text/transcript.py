@@ -0,0 +1,138 @@
+import math
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+
+from text.export_processors import Turn
+
+NO_SPEAKER = -1
+
+
+class Transcript:
+    """
+    Columnar transcript shared by the Amazon and Google adapters. Every row is a unit (a word or a
+    punctuation mark) with `start` and `end` seconds (NaN when unknown) and a `speaker`
+    id into `speakers`. The text of all units lives in one string: unit i is
+    `text[offsets[i]:offsets[i + 1]]`, stored with a leading space unless it is `attached` to the
+    unit before it, like punctuation. Slices share the arrays and the text instead of copying them.
+    Zoom transcripts do not go through it: their cues stream line by line into `PromtProcessor`,
+    which chunks by tokens rather than by units or time.
+    """
+
+    __slots__ = ('start', 'end', 'speaker', 'attached', 'offsets', 'text', 'speakers')
+
+    def __init__(self, start: np.ndarray, end: np.ndarray, speaker: np.ndarray, attached: np.ndarray,
+                 offsets: np.ndarray, text: str, speakers: list[str]):
+        self.start = start
+        self.end = end
+        self.speaker = speaker
+        self.attached = attached
+        self.offsets = offsets
+        self.text = text
+        self.speakers = speakers
+
+    @classmethod
+    def from_columns(cls, start: Sequence[float], end: Sequence[float], speaker: Sequence[int],
+                     texts: Sequence[str], attached: Sequence[bool] = None,
+                     speakers: list[str] = None) -> 'Transcript':
+        """
+        Builds a transcript from parallel columns; `array.array` and numpy columns are not copied.
+        """
+        attached = np.zeros(len(texts), dtype=bool) if attached is None else np.asarray(attached).astype(bool)
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)) + ~attached
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.asarray(start, dtype=np.float64), np.asarray(end, dtype=np.float64),
+                   np.asarray(speaker, dtype=np.int16), attached, offsets,
+                   ''.join(text if joined else ' ' + text for text, joined in zip(texts, attached.tolist())),
+                   list(speakers or []))
+
+    @classmethod
+    def from_units(cls, units: Iterable[tuple[float, float, Optional[str], str]]) -> 'Transcript':
+        """
+        Builds a transcript from (start, end, speaker label, text) units, interning the speakers.
+        """
+        start, end, speaker, texts, speaker_ids = [], [], [], [], {}
+        for unit_start, unit_end, label, text in units:
+            start.append(math.nan if unit_start is None else unit_start)
+            end.append(math.nan if unit_end is None else unit_end)
+            speaker.append(NO_SPEAKER if label is None else speaker_ids.setdefault(label, len(speaker_ids)))
+            texts.append(text)
+        return cls.from_columns(start, end, speaker, texts, speakers=list(speaker_ids))
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __getitem__(self, index: slice) -> 'Transcript':
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise ValueError('Transcripts only support contiguous slices')
+        stop = max(start, stop)
+        return Transcript(self.start[start:stop], self.end[start:stop], self.speaker[start:stop],
+                          self.attached[start:stop], self.offsets[start:stop + 1], self.text, self.speakers)
+
+    def speaker_label(self, index: int) -> Optional[str]:
+        speaker = self.speaker[index]
+        return None if speaker == NO_SPEAKER else self.speakers[speaker]
+
+    def content(self, index: int) -> str:
+        text = self.text[self.offsets[index]:self.offsets[index + 1]]
+        return text if self.attached[index] else text[1:]
+
+    def _anchors(self) -> np.ndarray:
+        # for every unit, the index of the closest unit at or before it that is not attached
+        positions = np.where(self.attached, 0, np.arange(len(self)))
+        return np.maximum.accumulate(positions) if len(self) else positions
+
+    def _filled(self, values: np.ndarray) -> np.ndarray:
+        # attached units take the value of their anchor, then the values are made non-decreasing
+        return np.fmax.accumulate(values[self._anchors()]) if len(self) else values
+
+    def group(self, max_gap: Optional[float] = 5) -> 'Transcript':
+        """
+        Merges consecutive units of the same speaker into turns of at most `max_gap` seconds from
+        their first unit (unbounded with None). Speaker changes are found with array operations;
+        only the gap splits inside a speaker run are searched, once per turn. The turns share this
+        transcript's text.
+        """
+        count = len(self)
+        if not count:
+            return self
+        anchors = self._anchors()
+        speaker = self.speaker[anchors]
+        starts = self._filled(self.start)
+        changes = np.flatnonzero((speaker[1:] != speaker[:-1]) & ~self.attached[1:]) + 1
+        runs = np.concatenate(([0], changes, [count]))
+        if max_gap is None:
+            begins = runs[:-1]
+        else:
+            begins = []
+            for run_begin, run_end in zip(runs[:-1], runs[1:]):
+                begin = run_begin
+                while begin < run_end:
+                    begins.append(begin)
+                    threshold = starts[begin] + max_gap
+                    if math.isnan(threshold):
+                        break
+                    begin = begin + int(np.searchsorted(starts[begin:run_end], threshold))
+            begins = np.asarray(begins, dtype=np.int64)
+        ends = self._filled(self.end)
+        last = np.append(begins[1:], count) - 1
+        return Transcript(starts[begins], ends[last], speaker[begins], self.attached[begins],
+                          np.append(self.offsets[begins], self.offsets[count]), self.text, self.speakers)
+
+    def turns(self, max_gap: Optional[float] = 5) -> list[Turn]:
+        """
+        `group` as `Turn`s, for the exporters.
+        """
+        grouped = self.group(max_gap)
+        return [Turn(float(grouped.start[i]), float(grouped.end[i]), grouped.speaker_label(i), grouped.content(i))
+                for i in range(len(grouped))]
+
+    def lines(self) -> Iterator[str]:
+        """
+        `speaker: text` for every unit, the line format of the summarization pipeline.
+        """
+        for i in range(len(self)):
+            label = self.speaker_label(i)
+            yield self.content(i) if label is None else f'{label}: {self.content(i)}'
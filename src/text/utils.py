@@ -0,0 +1,15 @@
+from glob import glob
+from pathlib import Path
+
+
+def get_list_of_transcripts(path: str, pattern: str = '*.vtt') -> list[str]:
+    """
+    Transcripts under a directory (recursively) or matching a glob.
+    """
+    if Path(path).is_dir():
+        transcripts = glob(str(Path(path) / '**' / pattern), recursive=True)
+    else:
+        transcripts = glob(path, recursive=True)
+    transcripts = sorted(transcripts)
+    print('Found {} transcripts'.format(len(transcripts)))
+    return transcripts
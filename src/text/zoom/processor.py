@@ -1,8 +1,25 @@
+from typing import Iterable, Iterator
+
 from text.processor import BaseTranscriptionProcessor
+from text.zoom.vtt import Cue, iter_file_cues
+
+
+def cue_line(cue: Cue) -> str:
+    if cue.speaker is None:
+        return cue.text
+    return f'{cue.speaker}: {cue.text}'
 
 
 class ZoomTranscriptionProcessor(BaseTranscriptionProcessor):
+    def cues(self, transcription_path: str) -> Iterator[Cue]:
+        return iter_file_cues(transcription_path)
+
+    def lines(self, transcription_path: str) -> Iterator[str]:
+        return map(cue_line, self.cues(transcription_path))
+
     def __call__(self, transcription_path: str) -> list[str]:
-        transcriptions = super().__call__(transcription_path)
-        transcript_lines = transcriptions[4::4]
-        return transcript_lines
+        return list(self.lines(transcription_path))
+
+    def stream(self, transcription_paths: Iterable[str]) -> Iterator[str]:
+        for transcription_path in transcription_paths:
+            yield from self.lines(transcription_path)
@@ -0,0 +1,96 @@
+import codecs
+import fnmatch
+import io
+import re
+import sys
+import tarfile
+import zipfile
+from collections import namedtuple
+from pathlib import Path
+from typing import Iterable, Iterator
+
+# start and end are milliseconds from the beginning of the recording
+Cue = namedtuple('Cue', ['start', 'end', 'speaker', 'text'])
+
+TIMESTAMP = re.compile(r'(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})')
+ZOOM_SPEAKER = re.compile(r'^([^:<>]{1,80}?):\s+(.*)$')
+VOICE_SPAN = re.compile(r'^<v(?:\.[^ >]*)?\s+([^>]+)>(.*?)(?:</v>)?$')
+
+
+def parse_timestamp(value: str) -> int:
+    match = TIMESTAMP.match(value.strip())
+    if match is None:
+        raise ValueError(f'Invalid WebVTT timestamp {value!r}')
+    hours, minutes, seconds, milliseconds = match.groups()
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(milliseconds)
+
+
+def _split_speaker(text: str) -> tuple:
+    for pattern in (VOICE_SPAN, ZOOM_SPEAKER):
+        match = pattern.match(text)
+        if match is not None:
+            # speakers repeat on every cue, interning keeps one copy of each name
+            return sys.intern(match.group(1).strip()), match.group(2).strip()
+    return None, text
+
+
+def _make_cue(timing: str, text_lines: list[str]) -> Cue:
+    start, _, rest = timing.partition('-->')
+    end = rest.split()[0]
+    speaker, text = _split_speaker(' '.join(text_lines))
+    return Cue(parse_timestamp(start), parse_timestamp(end), speaker, text)
+
+
+def iter_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    """
+    Yields the cues of a WebVTT document one at a time, holding only the current cue in memory.
+    Multi-line cue payloads are joined with spaces; Zoom `Name: text` and `<v Name>` speakers are split off.
+    """
+    timing, text_lines, skipping = None, [], True
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if timing is not None and text_lines:
+                yield _make_cue(timing, text_lines)
+            timing, text_lines, skipping = None, [], False
+            continue
+        if skipping:
+            continue
+        if timing is None:
+            if '-->' in line:
+                timing = line
+            elif line.startswith(('NOTE', 'STYLE', 'REGION')):
+                skipping = True
+            continue
+        text_lines.append(line)
+    if timing is not None and text_lines:
+        yield _make_cue(timing, text_lines)
+
+
+def iter_file_cues(path: str) -> Iterator[Cue]:
+    try:
+        f = open(path, 'r', encoding='utf-8-sig')
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File {path} not found")
+    with f:
+        yield from iter_cues(f)
+
+
+def iter_archive_cues(archive_path: str, pattern: str = '*.vtt') -> Iterator[tuple[str, Iterator[Cue]]]:
+    """
+    Streams the transcripts of a zip or tar archive without extracting it. Each member's cue
+    generator must be consumed before advancing to the next member.
+    """
+    archive_path = str(archive_path)
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for name in archive.namelist():
+                if fnmatch.fnmatch(Path(name).name, pattern):
+                    with archive.open(name) as member:
+                        yield name, iter_cues(io.TextIOWrapper(member, encoding='utf-8-sig'))
+        return
+    with tarfile.open(archive_path, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and fnmatch.fnmatch(Path(member.name).name, pattern):
+                # streamed tar members are not seekable, which TextIOWrapper requires
+                yield member.name, iter_cues(codecs.getreader('utf-8-sig')(archive.extractfile(member)))
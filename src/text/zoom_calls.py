@@ -1,7 +1,9 @@
 import logging
 
 from text.export_processors import TextExportProcessor
+from text.pipeline import Pipeline
 from text.summarizers.openai_adapter import OpenAIProcessor, PromtProcessor
+from text.summarizers.tree import TreeSummarizer
 from text.zoom.processor import ZoomTranscriptionProcessor
 
 logging.basicConfig(level=logging.INFO)
@@ -12,17 +14,13 @@ if __name__ == '__main__':
     promt_processor = PromtProcessor(2, 400, 4001)
     openai_processor = OpenAIProcessor()
     txt_processor = TextExportProcessor()
-    pipeline = [
+    pipeline = Pipeline([
         ZoomTranscriptionProcessor(),
-        promt_processor, openai_processor,
-        promt_processor,
-        openai_processor,
+        TreeSummarizer(promt_processor, openai_processor),
         txt_processor
-    ]
-    args = t
-    for step in pipeline:
-        args = step(args)
-    print(args)
+    ])
+    notes = pipeline(t)
+    print(notes)
     # text_processor = TextProcessor(ZoomTranscriptionProcessor())
     # tldr = text_processor.process(t)
     # print(tldr)
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+from utils.metrics import metrics
+
+MISSING = object()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        stats = dict(vars(self))
+        stats['hit_ratio'] = self.hit_ratio
+        return stats
+
+
+class CacheStore:
+    """
+    Two tier response cache: an in-memory LRU in front of an indexed SQLite file.
+    Entries are pickled and zlib compressed; the disk tier is bounded by `max_bytes`
+    (least recently used rows are evicted first). With `ttl`, entries of either tier older
+    than `ttl` seconds are misses.
+    """
+
+    def __init__(self, path: str = 'cache/responses.sqlite3', max_bytes: int = 512 * 1024 * 1024,
+                 ttl: Optional[float] = None, memory_items: int = 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.memory_items = memory_items
+        self.stats = CacheStats()
+        # key -> (created, value), created as in the disk tier so both expire together
+        self._memory: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.RLock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+            'created REAL NOT NULL, accessed REAL NOT NULL)'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS entries_created ON entries (created)')
+        self._size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def get(self, key: str, default=MISSING):
+        with self._lock:
+            now = time.time()
+            if key in self._memory:
+                created, value = self._memory[key]
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.stats.hits += 1
+                    self.stats.memory_hits += 1
+                    return value
+                del self._memory[key]
+            row = self._connection.execute('SELECT value, created FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._delete(key)
+                self.stats.misses += 1
+                return default
+            self._connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            self.stats.hits += 1
+            self.stats.disk_hits += 1
+            self.stats.bytes_read += len(row[0])
+            value = pickle.loads(zlib.decompress(row[0]))
+            self._remember(key, value, row[1])
+            return value
+
+    def put(self, key: str, value) -> None:
+        blob = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        now = time.time()
+        with self._lock:
+            self._delete(key)
+            self._connection.execute(
+                'INSERT INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, blob, len(blob), now, now)
+            )
+            self._size += len(blob)
+            self.stats.bytes_written += len(blob)
+            self._remember(key, value, now)
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._memory and not self._expired(self._memory[key][0], time.time()):
+                return True
+            row = self._connection.execute('SELECT created FROM entries WHERE key = ?', (key,)).fetchone()
+            return row is not None and not self._expired(row[0], time.time())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._connection.execute('DELETE FROM entries')
+            self._size = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key: str, value, created: float) -> None:
+        self._memory[key] = created, value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _delete(self, key: str) -> None:
+        self._memory.pop(key, None)
+        row = self._connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            self._connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._size -= row[0]
+
+    def _evict(self) -> None:
+        if self.ttl is not None:
+            expired = self._connection.execute(
+                'SELECT key FROM entries WHERE created < ?', (time.time() - self.ttl,)
+            ).fetchall()
+            for (key,) in expired:
+                self._delete(key)
+                self.stats.evictions += 1
+        while self._size > self.max_bytes:
+            row = self._connection.execute('SELECT key FROM entries ORDER BY accessed LIMIT 1').fetchone()
+            if row is None:
+                break
+            logging.debug(f'Evicting {row[0]} from {self.path}')
+            self._delete(row[0])
+            self.stats.evictions += 1
+
+
+def _encode(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    return repr(value)
+
+
+def make_key(name: str, args: tuple, kwargs: dict) -> str:
+    payload = json.dumps([name, args, sorted(kwargs.items())], default=_encode, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _register(store: CacheStore) -> None:
+    metrics.register('cache', lambda: dict(store.stats.as_dict(), size_bytes=store.size))
+
+
+_default_store: Optional[CacheStore] = None
+_default_lock = threading.Lock()
+
+
+def default_store() -> CacheStore:
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = CacheStore(
+                path=os.getenv('SUMMARIZATION_CACHE_PATH', 'cache/responses.sqlite3'),
+                max_bytes=int(os.getenv('SUMMARIZATION_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+                ttl=float(os.environ['SUMMARIZATION_CACHE_TTL']) if os.getenv('SUMMARIZATION_CACHE_TTL') else None,
+            )
+            _register(_default_store)
+        return _default_store
+
+
+def configure_cache(**kwargs) -> CacheStore:
+    """
+    Replaces the process wide store used by the `cache` decorator.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is not None:
+            _default_store.close()
+        _default_store = CacheStore(**kwargs)
+        _register(_default_store)
+        return _default_store
@@ -0,0 +1,207 @@
+import bisect
+import contextlib
+import cProfile
+import json
+import logging
+import pstats
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-th observation.
+        """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99),
+        }
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    """
+    Process wide counters, gauges and histograms, keyed by name and labels, exportable as a
+    JSON run report or in the Prometheus text format. Gauge callbacks are read at export time.
+    """
+
+    def __init__(self):
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.gauges: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+        self.callbacks: dict[str, Callable[[], dict]] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def max(self, name: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self.gauges.setdefault(name, {})
+            series[key] = max(series.get(key, value), value)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register(self, name: str, callback: Callable[[], dict]) -> None:
+        """
+        Adds gauges computed on export, e.g. the cache statistics; `callback` returns {gauge: value}.
+        """
+        self.callbacks[name] = callback
+
+    def _collect(self) -> None:
+        for prefix, callback in list(self.callbacks.items()):
+            for name, value in callback().items():
+                if isinstance(value, (int, float)):
+                    self.set(f'{prefix}_{name}', value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def as_dict(self) -> dict:
+        self._collect()
+        with self._lock:
+            return {
+                'started': self.started,
+                'elapsed': time.time() - self.started,
+                'counters': {name: [dict(labels, value=value) for labels, value in series.items()]
+                             for name, series in self.counters.items()},
+                'gauges': {name: [dict(labels, value=value) for labels, value in series.items()]
+                           for name, series in self.gauges.items()},
+                'histograms': {name: [dict(labels, **histogram.as_dict()) for labels, histogram in series.items()]
+                               for name, series in self.histograms.items()},
+            }
+
+    def to_prometheus(self, namespace: str = 'summarization') -> str:
+        self._collect()
+        lines = []
+        with self._lock:
+            for kind, families in (('counter', self.counters), ('gauge', self.gauges)):
+                for name, series in sorted(families.items()):
+                    lines.append(f'# TYPE {namespace}_{name} {kind}')
+                    for labels, value in series.items():
+                        lines.append(f'{namespace}_{name}{_format_labels(labels)} {value}')
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f'# TYPE {namespace}_{name} histogram')
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{namespace}_{name}_bucket{_format_labels(labels, (("le", bound),))} {cumulative}')
+                    lines.append(f'{namespace}_{name}_sum{_format_labels(labels)} {histogram.sum}')
+                    lines.append(f'{namespace}_{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, path: str) -> None:
+        """
+        Writes the JSON run report to `path` with a `.json` suffix and the Prometheus exposition
+        next to it with `.prom`, so neither overwrites the other whatever suffix `path` has.
+        """
+        json_path, prometheus_path = Path(path).with_suffix('.json'), Path(path).with_suffix('.prom')
+        with open(json_path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+        with open(prometheus_path, 'w') as f:
+            f.write(self.to_prometheus())
+        logging.info(f'Metrics written to {json_path} and {prometheus_path}')
+
+
+metrics = Metrics()
+
+
+@contextlib.contextmanager
+def profile(path: Optional[str] = None, sort: str = 'cumulative', limit: int = 30):
+    """
+    Opt-in cProfile of the enclosed block; dumps stats to `path` (for snakeviz and friends)
+    and logs the top `limit` functions.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        stats = pstats.Stats(profiler).sort_stats(sort)
+        stats.print_stats(limit)
+
+
+@contextlib.contextmanager
+def instrumented(metrics_path: Optional[str] = None, profile_path: Optional[str] = None):
+    """
+    Wraps a CLI run: profiles it when `profile_path` is set and writes the run report to `metrics_path`.
+    """
+    metrics.reset()
+    with profile(profile_path) if profile_path else contextlib.nullcontext():
+        try:
+            yield metrics
+        finally:
+            if metrics_path:
+                metrics.write_report(metrics_path)
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional, TYPE_CHECKING
+
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+
+WORD = re.compile(r'\w+')
+PRIME = (1 << 61) - 1
+
+
+def shingles(text: str, size: int = 5) -> 'np.ndarray':
+    """
+    crc32 hashes of the lowercase word `size`-grams; stable across processes, unlike hash().
+    """
+    # numpy is loaded on first use, configure_similarity(None) stays free at startup
+    import numpy as np
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        words = words + [''] * (size - len(words))
+    grams = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def lsh_bands(num_perm: int, threshold: float) -> tuple[int, int]:
+    """
+    (bands, rows) splitting the signature so that the LSH candidate threshold (1/bands)^(1/rows)
+    is closest to, and not above, `threshold`.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    return max(below or options[:1], key=lambda option: (1 / option[0]) ** (1 / option[1]))
+
+
+class SimilarityIndex:
+    """
+    Persistent MinHash/LSH index of prompt texts. `lookup` returns the key of a previously added
+    text whose estimated Jaccard similarity of word shingles is at least `threshold`, within the
+    same `namespace` (e.g. the request config). Signatures and LSH buckets live in SQLite.
+    """
+
+    def __init__(self, path: str = 'cache/similarity.sqlite3', threshold: float = 0.9, num_perm: int = 128,
+                 shingle_size: int = 5, seed: int = 1):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        import numpy as np
+        generator = np.random.default_rng(seed)
+        # a * x + b stays below 2 ** 64 for 32 bit shingle hashes
+        self._a = generator.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self._b = generator.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS signatures ('
+            'key TEXT PRIMARY KEY, namespace TEXT NOT NULL, signature BLOB NOT NULL, created REAL NOT NULL)'
+        )
+        self._connection.execute('CREATE TABLE IF NOT EXISTS buckets (bucket INTEGER NOT NULL, key TEXT NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket)')
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hit_ratio, 'entries': len(self)}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM signatures').fetchone()[0]
+
+    def signature(self, text: str) -> 'np.ndarray':
+        hashes = shingles(text, self.shingle_size)
+        return ((hashes[:, None] * self._a + self._b) % PRIME).min(axis=0)
+
+    def _buckets(self, signature: 'np.ndarray', namespace: str) -> list[int]:
+        buckets = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8,
+                                     person=band.to_bytes(2, 'little'), key=namespace.encode('utf-8')[:64])
+            buckets.append(int.from_bytes(digest.digest(), 'little', signed=True))
+        return buckets
+
+    def lookup(self, text: str, namespace: str = '') -> Optional[tuple[str, float]]:
+        """
+        Returns (key, estimated similarity) of the most similar indexed text above the threshold.
+        """
+        import numpy as np
+        signature = self.signature(text)
+        buckets = self._buckets(signature, namespace)
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT DISTINCT s.key, s.signature FROM buckets b JOIN signatures s ON s.key = b.key '
+                f'WHERE b.bucket IN ({",".join("?" * len(buckets))}) AND s.namespace = ?',
+                (*buckets, namespace)
+            ).fetchall()
+        best = None
+        for key, blob in rows:
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = key, similarity
+        if best is None:
+            self.misses += 1
+            metrics.inc('similarity_lookups_total', result='miss')
+        else:
+            self.hits += 1
+            metrics.inc('similarity_lookups_total', result='hit')
+        return best
+
+    def add(self, text: str, key: str, namespace: str = '') -> None:
+        signature = self.signature(text)
+        with self._lock:
+            if self._connection.execute('SELECT 1 FROM signatures WHERE key = ?', (key,)).fetchone():
+                return
+            self._connection.execute('BEGIN')
+            self._connection.execute('INSERT INTO signatures (key, namespace, signature, created) VALUES (?, ?, ?, ?)',
+                                     (key, namespace, signature.tobytes(), time.time()))
+            self._connection.executemany('INSERT INTO buckets (bucket, key) VALUES (?, ?)',
+                                         [(bucket, key) for bucket in self._buckets(signature, namespace)])
+            self._connection.execute('COMMIT')
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_default_index: Optional[SimilarityIndex] = None
+_default_lock = threading.Lock()
+
+
+def similarity_index() -> Optional[SimilarityIndex]:
+    """
+    The process wide index, or None while similarity reuse is off (the default). It is switched
+    on by `configure_similarity` or the SUMMARIZATION_SIMILARITY_THRESHOLD environment variable.
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is None and os.getenv('SUMMARIZATION_SIMILARITY_THRESHOLD'):
+            _default_index = SimilarityIndex(
+                path=os.getenv('SUMMARIZATION_SIMILARITY_PATH', 'cache/similarity.sqlite3'),
+                threshold=float(os.environ['SUMMARIZATION_SIMILARITY_THRESHOLD']),
+            )
+            metrics.register('similarity', _default_index.as_dict)
+        return _default_index
+
+
+def configure_similarity(threshold: Optional[float], **kwargs) -> Optional[SimilarityIndex]:
+    """
+    Replaces the process wide index; a `threshold` of None switches similarity reuse off.
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is not None:
+            _default_index.close()
+        _default_index = SimilarityIndex(threshold=threshold, **kwargs) if threshold else None
+        if _default_index is not None:
+            metrics.register('similarity', _default_index.as_dict)
+        return _default_index
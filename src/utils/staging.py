@@ -0,0 +1,121 @@
+import functools
+import logging
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from text.manifest import file_digest
+from utils.cache import default_store, make_key
+from utils.metrics import metrics
+
+S3_BUCKET = 'lokoai-lambdas-demo'
+GCS_BUCKET = 'home-experiments'
+PREFIX = 'recordings/'
+MULTIPART_CHUNK_SIZE = 64 * 1024 * 1024
+_MISSING_CODES = ('404', 'NoSuchKey', 'NotFound')
+
+_key_locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+_key_locks_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def s3_client(max_pool_connections: int = 32):
+    """
+    One S3 client per process; boto3 clients are thread safe and keep their connection pool.
+    """
+    import boto3
+    from botocore.config import Config as BotoConfig
+    return boto3.client('s3', config=BotoConfig(max_pool_connections=max_pool_connections))
+
+
+@functools.lru_cache(maxsize=None)
+def gcs_client():
+    from google.cloud import storage
+    return storage.Client()
+
+
+def content_digest(path: str) -> str:
+    """
+    sha256 of the file, remembered in the response cache by path, size and mtime so that a
+    multi-GB recording is only hashed once.
+    """
+    stat = os.stat(path)
+    key = make_key('content_digest', (str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns), {})
+    store = default_store()
+    digest = store.get(key, None)
+    if digest is None:
+        with metrics.timer('staging_hash_seconds'):
+            digest = file_digest(path)
+        store.put(key, digest)
+    return digest
+
+
+def content_key(path: str, prefix: str = PREFIX) -> str:
+    """
+    Object key derived from the content, so identical recordings share one object whatever their
+    names, and different recordings with the same name never collide. The suffix is kept for
+    services that infer the media format from it.
+    """
+    return f'{prefix}{content_digest(path)}{Path(path).suffix.lower()}'
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _key_locks_lock:
+        return _key_locks[key]
+
+
+def s3_exists(bucket: str, key: str, client=None) -> bool:
+    from botocore.exceptions import ClientError
+    try:
+        (client or s3_client()).head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in _MISSING_CODES:
+            return False
+        raise
+    return True
+
+
+def stage_to_s3(path: str, bucket: str = S3_BUCKET, prefix: str = PREFIX, client=None,
+                chunk_size: int = MULTIPART_CHUNK_SIZE, max_concurrency: int = 10) -> str:
+    """
+    Uploads `path` under its content key unless the object is already there, using parallel
+    multipart uploads above `chunk_size`. Returns the s3:// uri.
+    """
+    from boto3.s3.transfer import TransferConfig
+    client = client or s3_client()
+    key = content_key(path, prefix)
+    with _key_lock(f's3://{bucket}/{key}'):
+        if s3_exists(bucket, key, client):
+            logging.info(f'{path} is already staged as s3://{bucket}/{key}')
+            metrics.inc('staging_skipped_total', store='s3')
+        else:
+            logging.info(f'Uploading {path} to s3://{bucket}/{key}')
+            config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size,
+                                    max_concurrency=max_concurrency, use_threads=True)
+            with metrics.timer('staging_upload_seconds', store='s3'):
+                client.upload_file(str(path), bucket, key, ExtraArgs={'Metadata': {'source-name': Path(path).name}},
+                                   Config=config)
+            metrics.inc('staging_uploaded_bytes_total', os.path.getsize(path), store='s3')
+    return f's3://{bucket}/{key}'
+
+
+def stage_to_gcs(path: str, bucket: str = GCS_BUCKET, prefix: str = PREFIX, client=None,
+                 chunk_size: int = MULTIPART_CHUNK_SIZE) -> str:
+    """
+    Uploads `path` under its content key unless the blob exists, as a resumable upload in
+    `chunk_size` pieces so a dropped connection only repeats one chunk. Returns the gs:// uri.
+    """
+    client = client or gcs_client()
+    key = content_key(path, prefix)
+    with _key_lock(f'gs://{bucket}/{key}'):
+        blob = client.bucket(bucket).blob(key, chunk_size=chunk_size)
+        if blob.exists(client):
+            logging.info(f'{path} is already staged as gs://{bucket}/{key}')
+            metrics.inc('staging_skipped_total', store='gcs')
+        else:
+            logging.info(f'Uploading {path} to gs://{bucket}/{key}')
+            with metrics.timer('staging_upload_seconds', store='gcs'):
+                blob.upload_from_filename(str(path))
+            metrics.inc('staging_uploaded_bytes_total', os.path.getsize(path), store='gcs')
+    return f'gs://{bucket}/{key}'
@@ -1,32 +1,24 @@
+import functools
 import hashlib
 import json
 import logging
 import pickle
 from collections import namedtuple
-from glob import glob
 from pathlib import Path
+from typing import Optional
 
-import boto3
-from botocore.exceptions import ClientError
+from utils.cache import default_store, make_key, MISSING
+from utils.metrics import metrics
 
-def upload_file_to_s3(audio_path: str):
-    bucket_name = 'lokoai-lambdas-demo'
-    s3_client = boto3.client('s3')
-    project_name = Path(audio_path).name
-    if not check_s3_file(bucket_name, project_name):
-        print('uploading {} to s3'.format(project_name))
-        s3_client.upload_file(audio_path, bucket_name, project_name)
-    return f's3://{bucket_name}/{project_name}'
 
+def upload_file_to_s3(audio_path: str) -> str:
+    from utils.staging import stage_to_s3
+    return stage_to_s3(audio_path)
 
-def check_s3_file(bucket_name, project_name):
-    s3_client = boto3.client('s3')
-    try:
-        return s3_client.head_object(Bucket=bucket_name, Key=project_name)
-    except ClientError:
-        # Not found
-        pass
-    return False
+
+def check_s3_file(bucket_name, project_name) -> bool:
+    from utils.staging import s3_exists
+    return s3_exists(bucket_name, project_name)
 
 
 # temperature number Optional Defaults to 1
@@ -66,23 +58,46 @@ def process_arguments(args: list) -> list[str]:
     return results
 
 
+def _legacy_cache_path(function, args, kwargs) -> Optional[Path]:
+    _args = process_arguments(args)
+    if kwargs or len(_args) != len(args):
+        # the old cache only hashed str and Config positionals, anything else was ambiguous
+        return None
+    h = hashlib.sha256(bytes(''.join(_args), "utf-8")).hexdigest()
+    return Path(f'cache/{function.__name__}_{h}.pickle')
+
+
 def cache(function):
+    """
+    Memoizes `function` in the shared `CacheStore`, keyed on its name and all args and kwargs.
+    Responses pickled by the previous one-file-per-request cache are migrated on first access.
+    """
+
+    def cache_key(*args, **kwargs) -> str:
+        return make_key(function.__name__, args, kwargs)
+
+    @functools.wraps(function)
     def wrapper(*args, **kwargs):
-        _args = process_arguments(args)
-        hash_object = hashlib.sha256(bytes(''.join(_args), "utf-8"))
-        h = hash_object.hexdigest()
-        Path("cache").mkdir(parents=True, exist_ok=True)
-        if not glob(f'cache/{function.__name__}_{h}.pickle'):
-            print('Cache miss. Making new request.')
-            response = function(*args, **kwargs)
-            logging.debug('Caching...')
-            logging.debug(f'to cache/{function.__name__}_{h}.pickle')
-            with open(f'cache/{function.__name__}_{h}.pickle', 'wb') as f:
-                pickle.dump(response, f)
-        else:
-            print(f'from cache/{function.__name__}_{h}.pickle')
-            with open(f'cache/{function.__name__}_{h}.pickle', 'rb') as f:
+        store = default_store()
+        key = cache_key(*args, **kwargs)
+        with metrics.timer('cache_seconds', function=function.__name__, op='get'):
+            response = store.get(key)
+        if response is not MISSING:
+            metrics.inc('cache_hits_total', function=function.__name__)
+            logging.debug(f'{function.__name__} {key} from cache')
+            return response
+        metrics.inc('cache_misses_total', function=function.__name__)
+        legacy_path = _legacy_cache_path(function, args, kwargs)
+        if legacy_path is not None and legacy_path.exists():
+            logging.debug(f'Migrating {legacy_path}')
+            with open(legacy_path, 'rb') as f:
                 response = pickle.load(f)
+        else:
+            logging.debug(f'{function.__name__} {key} cache miss, making new request')
+            response = function(*args, **kwargs)
+        with metrics.timer('cache_seconds', function=function.__name__, op='put'):
+            store.put(key, response)
         return response
 
+    wrapper.cache_key = cache_key
     return wrapper
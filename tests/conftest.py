@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the modules import each other from src, like `python src/main.py` does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
@@ -0,0 +1,20 @@
+import pytest
+
+from text.segmenter import split_lines, split_sentences
+
+
+@pytest.mark.parametrize('text, sentences', [
+    ('We met Dr. Smith today. He agreed.', ['We met Dr. Smith today.', 'He agreed.']),
+    ('Купили хлеб, молоко и т.д. Потом пошли домой.', ['Купили хлеб, молоко и т.д. Потом пошли домой.']),
+    ('Это важно, т.е. срочно. Сделаем завтра.', ['Это важно, т.е. срочно.', 'Сделаем завтра.']),
+    ('It costs 5 dollars. 10 people came!', ['It costs 5 dollars.', '10 people came!']),
+    ('J. R. R. Tolkien wrote it. Really.', ['J. R. R. Tolkien wrote it.', 'Really.']),
+    ('no capital after this. so it stays', ['no capital after this. so it stays']),
+])
+def test_split_sentences(text, sentences):
+    assert split_sentences(text) == sentences
+
+
+def test_every_line_ends_a_sentence():
+    assert split_lines(['A: we agreed on the plan', 'B: Great. Next item.']) == \
+        ['A: we agreed on the plan', 'B: Great.', 'Next item.']
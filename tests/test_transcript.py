@@ -0,0 +1,40 @@
+from typing import List
+
+import pytest
+
+from audio.amazon.reader import ItemColumns, read_transcribe
+from benchmarks.synthetic import amazon_transcript
+from text.export_processors import Turn
+
+
+def legacy_turns(columns: ItemColumns, max_gap: float = 5) -> List[Turn]:
+    # the item by item grouping Transcript.group replaced
+    turns: List[Turn] = []
+    begin = last = 0
+    for i in range(1, len(columns) + 1):
+        if i < len(columns):
+            if columns.punctuation[i]:
+                continue
+            if columns.speaker[i] == columns.speaker[begin] and columns.start[i] - columns.start[begin] < max_gap:
+                last = i
+                continue
+        text = ''.join(columns.content[j] if columns.punctuation[j] or j == begin else ' ' + columns.content[j]
+                       for j in range(begin, i))
+        turns.append(Turn(columns.start[begin], columns.end[last], columns.speaker_label(begin), text))
+        begin = last = i
+    return turns
+
+
+@pytest.mark.parametrize('minutes, seed, speakers', [(5, 0, 1), (30, 1, 3), (60, 2, 6)])
+def test_turns_match_legacy_grouping(minutes, seed, speakers):
+    columns = read_transcribe(amazon_transcript(minutes, seed, speakers))
+    turns = columns.transcript().turns()
+    assert len(turns) > 1
+    assert turns == legacy_turns(columns)
+
+
+def test_turns_without_gap_limit_follow_speakers():
+    columns = read_transcribe(amazon_transcript(10, seed=3, speakers=2))
+    turns = columns.transcript().turns(max_gap=None)
+    assert all(turn.speaker_label != following.speaker_label for turn, following in zip(turns, turns[1:]))
+    assert ' '.join(turn.content for turn in turns) == ' '.join(turn.content for turn in columns.transcript().turns())
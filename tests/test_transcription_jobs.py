@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from audio.amazon.jobs import TranscriptionJobManager
+from audio.amazon.subtitles import create_subtitle
+from audio.amazon.transcriber import AWSTranscriber
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fakes import FakeTranscribeClient
+
+
+@pytest.fixture
+def server():
+    with FakeOpenAIServer(seed=0) as server:
+        yield server
+
+
+def manager(client: FakeTranscribeClient, path) -> TranscriptionJobManager:
+    return TranscriptionJobManager(client, artifacts_path=str(path), initial_delay=0.01, max_delay=0.05)
+
+
+def test_completed_job_is_downloaded(server, tmp_path):
+    client = FakeTranscribeClient(server, duration=0.05, minutes=1)
+    jobs = list(manager(client, tmp_path).transcribe(['s3://bucket/a.mp4', 's3://bucket/b.mp4']))
+    assert sorted(job.name for job in jobs) == ['a.mp4-en-US', 'b.mp4-en-US']
+    assert all(job.status == 'COMPLETED' and job.transcript_path.exists() for job in jobs)
+    assert client.calls['start_transcription_job'] == 2
+
+
+def test_failed_job_has_no_transcript(server, tmp_path):
+    client = FakeTranscribeClient(server, duration=0.05, failure_rate=1.0)
+    [job] = manager(client, tmp_path).transcribe(['s3://bucket/a.mp4'])
+    assert job.status == 'FAILED'
+    assert job.transcript_path is None
+    assert job.failure_reason == 'Injected failure'
+
+
+def test_finished_job_is_picked_up(server, tmp_path):
+    client = FakeTranscribeClient(server, duration=0, minutes=1)
+    client.jobs['a.mp4-en-US'] = {'started': time.monotonic(), 'failed': False, 'request': {}}
+    [job] = manager(client, tmp_path).transcribe(['s3://bucket/a.mp4'])
+    assert job.status == 'COMPLETED'
+    assert client.calls['start_transcription_job'] == 1
+    # the transcript is on disk now, so a rerun neither starts nor polls the job
+    polls = client.calls['get_transcription_job']
+    [job] = manager(client, tmp_path).transcribe(['s3://bucket/a.mp4'])
+    assert job.status == 'COMPLETED'
+    assert client.calls == {'start_transcription_job': 1, 'get_transcription_job': polls}
+
+
+def test_transcriber_result_reads_as_subtitles(server, tmp_path):
+    client = FakeTranscribeClient(server, duration=0, minutes=1)
+    path = AWSTranscriber('s3://bucket/a.mp4', 'en-US', manager(client, tmp_path)).transcribe()
+    assert path.exists()
+    assert create_subtitle(path)
+
+
+def test_transcriber_returns_none_for_failed_job(server, tmp_path):
+    client = FakeTranscribeClient(server, duration=0, failure_rate=1.0)
+    assert AWSTranscriber('s3://bucket/a.mp4', 'en-US', manager(client, tmp_path)).transcribe() is None